@@ -1,21 +1,40 @@
 import os
+import asyncio
+import base64
+import gzip
+import hashlib
+import math
 import time
-import json
+import random
 import logging
 import threading
 import gspread
+import orjson
 import requests
-from decimal import Decimal, ROUND_DOWN
+from collections import OrderedDict, defaultdict, deque
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
 from typing import Dict, Any
 from datetime import datetime
 from google.oauth2.service_account import Credentials
+from gspread.utils import rowcol_to_a1
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from anyio import to_thread as anyio_to_thread
+from fastapi import FastAPI, Request, Response, HTTPException
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+from binance import ThreadedWebsocketManager
 from binance.client import Client
 from binance.exceptions import BinanceAPIException
 from dotenv import load_dotenv
 
+try:
+    import uvloop
+except ImportError:  # Windows ou dépendance absente : boucle asyncio standard
+    uvloop = None
+
 # ==================== CHARGEMENT VARIABLES ENVIRONNEMENT ====================
 load_dotenv()
 
@@ -25,7 +44,12 @@ API_SECRET = os.getenv("BINANCE_API_SECRET", "")
 USE_TESTNET = os.getenv("USE_TESTNET", "true").lower() == "true"
 PORT = int(os.getenv("PORT", 8000))
 POLL_INTERVAL = float(os.getenv("POLL_INTERVAL", 2.0))
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", 20))
+STATE_FILE = os.getenv("STATE_FILE", "state.json")
+STATE_SYNC_INTERVAL = float(os.getenv("STATE_SYNC_INTERVAL", 10.0))
+STATE_WRITE_DEBOUNCE = float(os.getenv("STATE_WRITE_DEBOUNCE", 0.5))
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", 32))
 
 # Vérification des clés API
 if not API_KEY or not API_SECRET:
@@ -39,8 +63,8 @@ if not GOOGLE_SHEETS_CREDENTIALS_JSON or not SPREADSHEET_ID:
     raise Exception("❌ Configuration Google Sheets manquante! Configure GOOGLE_SHEETS_CREDENTIALS_JSON et SPREADSHEET_ID dans .env")
 
 try:
-    SERVICE_ACCOUNT_JSON = json.loads(GOOGLE_SHEETS_CREDENTIALS_JSON)
-except json.JSONDecodeError as e:
+    SERVICE_ACCOUNT_JSON = orjson.loads(GOOGLE_SHEETS_CREDENTIALS_JSON)
+except orjson.JSONDecodeError as e:
     raise Exception(f"❌ Format JSON invalide pour GOOGLE_SHEETS_CREDENTIALS_JSON: {e}")
 
 # Configuration du logging
@@ -50,16 +74,95 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
-app = FastAPI()
+# Boucle uvloop quand disponible (uvicorn la choisit aussi automatiquement si installée)
+if uvloop is not None:
+    uvloop.install()
+
+# Démarrage/arrêt via lifespan (les hooks @app.on_event sont dépréciés)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Démarrage et arrêt de l'application (fonctions définies plus bas, résolues à l'exécution)"""
+    configure_blocking_pool()
+    ensure_signal_consumers()
+    yield
+    await drain_signal_queue()
+    await stop_signal_consumers()
+    await asyncio.to_thread(shutdown_flush)
+
+# Réponses sérialisées avec orjson plutôt que le json standard
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+
+# ==================== SESSIONS HTTP ====================
+def configure_http_session(session: requests.Session):
+    """Agrandit le pool de connexions keep-alive d'une session HTTP"""
+    # Retry urllib3 : seules les méthodes idempotentes sont rejouées (jamais un POST d'ordre)
+    adapter = HTTPAdapter(
+        pool_connections=32,
+        pool_maxsize=64,
+        max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=(502, 503, 504))
+    )
+    session.mount('https://', adapter)
+    session.headers['Connection'] = 'keep-alive'
+    return session
 
 # ==================== GOOGLE SHEETS HANDLER ====================
+# Nombre de sauvegardes d'état conservées (lignes 2 à 11 utilisées en buffer circulaire)
+STATE_SLOTS = 10
+# État envoyé compressé (gzip + base64, préfixe "gz:") au-delà de cette taille JSON
+STATE_COMPRESS_MIN_BYTES = 2048
+STATE_GZIP_PREFIX = "gz:"
+# Derniers enregistrements gardés en mémoire pour /history
+HISTORY_RECENT_MAX = 500
+# Relecture complète de l'historique au plus toutes les HISTORY_STATS_TTL secondes (modifications manuelles)
+HISTORY_STATS_TTL = 300
+
+HISTORY_HEADERS = [
+    "ID", "Date Heure", "Type", "Symbole", "Direction", "Niveau",
+    "Prix Entrée", "Quantité", "Capital", "Effet Levier", 
+    "Prix TP", "Prix SL", "Prix Fermeture", "Type Fermeture",
+    "Profit/Loss (USDT)", "Statut", "Order ID", "TP Order ID", "SL Order ID",
+    "Niveau Renforcement Suivant", "Durée Position", "Timestamp"
+]
+
+def encode_state_cell(state_data) -> str:
+    """Sérialise l'état pour la cellule State (compressé s'il est volumineux ; JSON déjà sérialisé accepté)"""
+    payload = state_data if isinstance(state_data, bytes) else orjson.dumps(state_data)
+    if len(payload) < STATE_COMPRESS_MIN_BYTES:
+        return payload.decode()
+    return STATE_GZIP_PREFIX + base64.b64encode(gzip.compress(payload, compresslevel=6)).decode()
+
+def decode_state_cell(cell: str):
+    """Relit une cellule State, compressée ou en JSON brut (anciennes sauvegardes)"""
+    if cell.startswith(STATE_GZIP_PREFIX):
+        return orjson.loads(gzip.decompress(base64.b64decode(cell[len(STATE_GZIP_PREFIX):])))
+    return orjson.loads(cell)
+
 class GoogleSheetsHandler:
     def __init__(self):
         self.client = None
         self.spreadsheet = None
         self.history_sheet = None
         self.state_sheet = None
+        # Compteurs de lignes en mémoire (en-tête inclus) pour éviter de relire les feuilles
+        self._history_row_count = 0
+        # Buffer circulaire de la feuille State : prochain emplacement + nombre d'emplacements remplis
+        self._state_slot = 0
+        self._state_records = 0
+        self._counter_lock = threading.Lock()
+        # Tampons en attente d'envoi groupé : lignes d'historique + dernière sauvegarde d'état
+        self._pending_history = []
+        self._pending_state = None
+        self._history_flush_event = threading.Event()
+        self._flush_lock = threading.Lock()
+        # Projection en mémoire de l'historique : derniers records + statistiques cumulées
+        self._recent_records = deque(maxlen=HISTORY_RECENT_MAX)
+        self._history_stats = None
+        self._history_loaded_at = 0.0
+        self._recent_loaded_at = 0.0
         self.init_connection()
+        
+        self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flush_thread.start()
     
     def init_connection(self):
         """Initialise la connexion à Google Sheets"""
@@ -67,6 +170,7 @@ class GoogleSheetsHandler:
             scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
             creds = Credentials.from_service_account_info(SERVICE_ACCOUNT_JSON, scopes=scope)
             self.client = gspread.authorize(creds)
+            configure_http_session(self.client.session)
             self.spreadsheet = self.client.open_by_key(SPREADSHEET_ID)
             
             self.init_history_sheet()
@@ -82,19 +186,17 @@ class GoogleSheetsHandler:
         """Initialise la feuille d'historique"""
         try:
             # Utiliser la première feuille sans changer son titre
-            self.history_sheet = self.spreadsheet.sheet1
+            history_sheet = self.spreadsheet.sheet1
             
             # Vérifier/créer les en-têtes
-            if not self.history_sheet.get('A1'):
-                headers = [
-                    "ID", "Date Heure", "Type", "Symbole", "Direction", "Niveau",
-                    "Prix Entrée", "Quantité", "Capital", "Effet Levier", 
-                    "Prix TP", "Prix SL", "Prix Fermeture", "Type Fermeture",
-                    "Profit/Loss (USDT)", "Statut", "Order ID", "TP Order ID", "SL Order ID",
-                    "Niveau Renforcement Suivant", "Durée Position", "Timestamp"
-                ]
-                self.history_sheet.append_row(headers)
+            if not history_sheet.get('A1'):
+                history_sheet.append_row(HISTORY_HEADERS)
                 logging.info("📊 Feuille Historique initialisée")
+            
+            # Une seule lecture de colonne au démarrage, ensuite compteur local
+            self._history_row_count = len(history_sheet.col_values(1))
+            # Feuille exposée seulement une fois le compteur connu : sinon l'ID 0 écraserait l'en-tête (ligne 1)
+            self.history_sheet = history_sheet
                 
         except Exception as e:
             logging.error(f"❌ Erreur initialisation historique: {e}")
@@ -106,10 +208,31 @@ class GoogleSheetsHandler:
             try:
                 self.state_sheet = self.spreadsheet.worksheet("State")
             except gspread.WorksheetNotFound:
-                self.state_sheet = self.spreadsheet.add_worksheet(title="State", rows=100, cols=5)
-                # En-têtes pour State
-                self.state_sheet.append_row(["timestamp", "state_json"])
+                # Création + en-têtes en un seul batchUpdate : sheetId fixé (supérieur aux ids existants,
+                # donc libre) pour que updateCells cible la nouvelle feuille
+                sheet_id = max((ws.id for ws in self.spreadsheet.worksheets()), default=0) + 1
+                response = self.spreadsheet.batch_update({"requests": [
+                    {"addSheet": {"properties": {
+                        "sheetId": sheet_id,
+                        "title": "State",
+                        "gridProperties": {"rowCount": 100, "columnCount": 5}
+                    }}},
+                    {"updateCells": {
+                        "start": {"sheetId": sheet_id, "rowIndex": 0, "columnIndex": 0},
+                        "rows": [{"values": [{"userEnteredValue": {"stringValue": h}} for h in ("timestamp", "state_json")]}],
+                        "fields": "userEnteredValue"
+                    }}
+                ]})
+                self.state_sheet = gspread.Worksheet(self.spreadsheet, response["replies"][0]["addSheet"]["properties"])
                 logging.info("🔧 Feuille State créée")
+            
+            # Reprendre le buffer circulaire après l'emplacement le plus récent
+            rows = self._read_state_slots()
+            filled = [i for i, row in enumerate(rows) if len(row) >= 2 and row[1]]
+            self._state_records = len(filled)
+            if filled:
+                newest = max(filled, key=lambda i: rows[i][0])
+                self._state_slot = newest + 1
                 
         except Exception as e:
             logging.error(f"❌ Erreur initialisation state: {e}")
@@ -122,53 +245,61 @@ class GoogleSheetsHandler:
             return False
             
         try:
+            # Une seule lecture de l'horloge pour toute la ligne
+            now = datetime.now()
+            
             # Calculer durée si fermeture
             duration = ""
             if entry_type == "POSITION_CLOSED":
-                open_timestamp = data.get("open_timestamp")
-                if open_timestamp:
+                open_ts = data.get("open_ts")
+                if open_ts is not None:
                     try:
-                        open_time = datetime.fromisoformat(open_timestamp.replace('Z', '+00:00'))
-                        close_time = datetime.now()
-                        duration_seconds = (close_time - open_time).total_seconds()
-                        hours = int(duration_seconds // 3600)
-                        minutes = int((duration_seconds % 3600) // 60)
-                        seconds = int(duration_seconds % 60)
-                        duration = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+                        duration_seconds = now.timestamp() - open_ts
+                        minutes, seconds = divmod(int(duration_seconds), 60)
+                        hours, minutes = divmod(minutes, 60)
+                        duration = "%02d:%02d:%02d" % (hours, minutes, seconds)
                     except Exception as e:
                         logging.warning(f"⚠️ Erreur calcul durée: {e}")
             
-            # Nouvel ID
-            existing_records = self.history_sheet.get_all_records()
-            new_id = len(existing_records) + 1
+            with self._counter_lock:
+                # Nouvel ID = nombre de lignes de données + 1 (l'en-tête occupe la ligne 1)
+                new_id = self._history_row_count
+                
+                # Nouvelle ligne
+                new_row = [
+                    new_id,
+                    now.strftime("%Y-%m-%d %H:%M:%S"),
+                    entry_type,
+                    data.get("symbol", ""),
+                    data.get("direction", ""),
+                    data.get("level", 1),
+                    data.get("entry_price", 0),
+                    data.get("quantity", 0),
+                    data.get("capital", 0),
+                    data.get("leverage", 1),
+                    data.get("tp_price", 0),
+                    data.get("sl_price", 0),
+                    data.get("close_price", 0),
+                    data.get("close_type", ""),
+                    data.get("profit_loss", 0),
+                    "ACTIVE" if entry_type in ["POSITION_OPENED", "REINFORCEMENT_OPENED"] else "CLOSED",
+                    data.get("order_id", ""),
+                    data.get("tp_order_id", ""),
+                    data.get("sl_order_id", ""),
+                    data.get("next_reinforcement_level", 1),
+                    duration,
+                    now.isoformat()
+                ]
+                
+                # Mise en tampon, l'envoi est fait par le thread de flush
+                self._pending_history.append(new_row)
+                self._history_row_count += 1
+                self._record_in_projection(dict(zip(HISTORY_HEADERS, new_row)))
+                buffer_full = len(self._pending_history) >= HISTORY_BATCH_SIZE
             
-            # Nouvelle ligne
-            new_row = [
-                new_id,
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                entry_type,
-                data.get("symbol", ""),
-                data.get("direction", ""),
-                data.get("level", 1),
-                data.get("entry_price", 0),
-                data.get("quantity", 0),
-                data.get("capital", 0),
-                data.get("leverage", 1),
-                data.get("tp_price", 0),
-                data.get("sl_price", 0),
-                data.get("close_price", 0),
-                data.get("close_type", ""),
-                data.get("profit_loss", 0),
-                "ACTIVE" if entry_type in ["POSITION_OPENED", "REINFORCEMENT_OPENED"] else "CLOSED",
-                data.get("order_id", ""),
-                data.get("tp_order_id", ""),
-                data.get("sl_order_id", ""),
-                data.get("next_reinforcement_level", 1),
-                duration,
-                datetime.now().isoformat()
-            ]
+            if buffer_full:
+                self._history_flush_event.set()
             
-            self.history_sheet.append_row(new_row)
             logging.info(f"📝 Record ajouté: {entry_type} - {data.get('symbol', '')}")
             return True
             
@@ -176,24 +307,193 @@ class GoogleSheetsHandler:
             logging.error(f"❌ Erreur ajout record: {e}")
             return False
     
+    @staticmethod
+    def _compute_stats(records):
+        """Compteurs des positions fermées (un seul passage, une conversion par ligne)"""
+        total_trades = winning_trades = losing_trades = 0
+        total_profit = 0.0
+        for r in records:
+            if r.get("Statut") != "CLOSED":
+                continue
+            profit = float(r.get("Profit/Loss (USDT)", 0) or 0)
+            total_trades += 1
+            total_profit += profit
+            if profit > 0:
+                winning_trades += 1
+            elif profit < 0:
+                losing_trades += 1
+        return {
+            "total_trades": total_trades,
+            "total_profit": total_profit,
+            "winning_trades": winning_trades,
+            "losing_trades": losing_trades,
+        }
+    
+    def _record_in_projection(self, record):
+        """Met à jour la projection en mémoire (appelé sous _counter_lock)"""
+        self._recent_records.append(record)
+        if self._history_stats is not None:
+            delta = self._compute_stats([record])
+            for key, value in delta.items():
+                self._history_stats[key] += value
+    
+    @staticmethod
+    def _rows_to_records(rows):
+        """Lignes brutes de la feuille -> dicts indexés par les en-têtes de l'historique"""
+        width = len(HISTORY_HEADERS)
+        # Les cellules vides de fin de ligne ne sont pas renvoyées par l'API
+        return [dict(zip(HISTORY_HEADERS, row + [""] * (width - len(row)))) for row in rows]
+    
+    def _load_history(self):
+        """Relit toute la feuille et reconstruit la projection en mémoire"""
+        # Sous _flush_lock : chaque ligne est soit déjà dans la feuille, soit encore en attente
+        with self._flush_lock:
+            # Valeurs brutes (nombres déjà typés), colonnes connues : ni relecture ni analyse de l'en-tête
+            rows = self.history_sheet.get(
+                f"A2:{rowcol_to_a1(1, len(HISTORY_HEADERS))[:-1]}",
+                value_render_option="UNFORMATTED_VALUE"
+            )
+            records = self._rows_to_records(rows)
+            with self._counter_lock:
+                records.extend(dict(zip(HISTORY_HEADERS, row)) for row in self._pending_history)
+                self._recent_records.clear()
+                self._recent_records.extend(records[-HISTORY_RECENT_MAX:])
+                self._history_stats = self._compute_stats(records)
+                self._history_loaded_at = self._recent_loaded_at = time.monotonic()
+        return records
+    
+    def _load_last_records(self, limit, seed=False):
+        """Lit seulement les `limit` dernières lignes de la feuille (+ lignes en attente)"""
+        width = len(HISTORY_HEADERS)
+        with self._flush_lock:
+            with self._counter_lock:
+                # Dernière ligne déjà écrite dans la feuille (en-tête en ligne 1)
+                last_row = self._history_row_count - len(self._pending_history)
+            rows = []
+            if last_row >= 2:
+                first_row = max(2, last_row - limit + 1)
+                rows = self.history_sheet.get(
+                    f"A{first_row}:{rowcol_to_a1(last_row, width)}",
+                    value_render_option="UNFORMATTED_VALUE"
+                )
+            records = self._rows_to_records(rows)
+            with self._counter_lock:
+                records.extend(dict(zip(HISTORY_HEADERS, row)) for row in self._pending_history)
+                if seed:
+                    self._recent_records.clear()
+                    self._recent_records.extend(records[-HISTORY_RECENT_MAX:])
+                    self._recent_loaded_at = time.monotonic()
+        return records[-limit:]
+    
+    def _history_is_stale(self):
+        return self._history_stats is None or time.monotonic() - self._history_loaded_at > HISTORY_STATS_TTL
+    
+    def get_recent_records(self, limit=50):
+        """Derniers enregistrements, servis depuis la mémoire quand c'est possible"""
+        if not self.history_sheet or limit <= 0:
+            return []
+        # Plage limitée aux dernières lignes : pas de get_all_records pour un simple affichage
+        if limit > HISTORY_RECENT_MAX:
+            return self._load_last_records(limit)
+        if not self._recent_loaded_at or time.monotonic() - self._recent_loaded_at > HISTORY_STATS_TTL:
+            self._load_last_records(HISTORY_RECENT_MAX, seed=True)
+        with self._counter_lock:
+            return list(self._recent_records)[-limit:]
+    
+    def get_history_stats(self):
+        """Statistiques des positions fermées, tenues à jour à chaque ajout"""
+        if not self.history_sheet:
+            stats = self._compute_stats([])
+        else:
+            if self._history_is_stale():
+                self._load_history()
+            with self._counter_lock:
+                stats = dict(self._history_stats)
+        
+        stats["total_profit"] = round(stats["total_profit"], 2)
+        if stats["total_trades"] > 0:
+            stats["win_rate"] = round((stats["winning_trades"] / stats["total_trades"]) * 100, 2)
+        else:
+            stats["win_rate"] = 0
+        return stats
+    
+    @staticmethod
+    def _cell_data(value):
+        """Valeur Python -> CellData de l'API Sheets (équivalent de valueInputOption RAW)"""
+        if value is None or value == "":
+            return {}
+        if isinstance(value, bool):
+            return {"userEnteredValue": {"boolValue": value}}
+        if isinstance(value, (int, float)):
+            return {"userEnteredValue": {"numberValue": value}}
+        return {"userEnteredValue": {"stringValue": str(value)}}
+    
+    def flush(self):
+        """Envoie historique et état en attente en une seule requête batch_update"""
+        with self._flush_lock:
+            with self._counter_lock:
+                rows, self._pending_history = self._pending_history, []
+                pending_state, self._pending_state = self._pending_state, None
+            
+            if not rows and not pending_state:
+                return True
+            
+            try:
+                batch = []
+                if rows:
+                    # Ajout après la dernière ligne remplie (grille agrandie au besoin) : une ligne saisie
+                    # à la main n'est jamais écrasée, contrairement à une plage absolue A{ID+1}
+                    batch.append({"appendCells": {
+                        "sheetId": self.history_sheet.id,
+                        "rows": [{"values": [self._cell_data(v) for v in row]} for row in rows],
+                        "fields": "userEnteredValue"
+                    }})
+                if pending_state:
+                    state_row, state_values = pending_state
+                    batch.append({"updateCells": {
+                        "start": {"sheetId": self.state_sheet.id, "rowIndex": state_row - 1, "columnIndex": 0},
+                        "rows": [{"values": [self._cell_data(v) for v in state_values]}],
+                        "fields": "userEnteredValue"
+                    }})
+                
+                self.spreadsheet.batch_update({"requests": batch})
+                if rows:
+                    logging.info(f"📤 {len(rows)} record(s) envoyé(s) à Google Sheets")
+                return True
+            except Exception as e:
+                logging.error(f"❌ Erreur envoi Google Sheets: {e}")
+                with self._counter_lock:
+                    # Remettre les lignes en tête du tampon pour conserver l'ordre des IDs
+                    self._pending_history[:0] = rows
+                    if self._pending_state is None:
+                        self._pending_state = pending_state
+                return False
+    
+    def _flush_loop(self):
+        """Boucle d'envoi groupé vers Google Sheets"""
+        while True:
+            self._history_flush_event.wait(timeout=POLL_INTERVAL)
+            self._history_flush_event.clear()
+            if self.history_sheet:
+                self.flush()
+    
     # ==================== GESTION ÉTAT ====================
     def save_state(self, state_data):
-        """Sauvegarde l'état de l'application"""
+        """Sauvegarde l'état (dict ou JSON déjà sérialisé), envoyé avec l'historique en attente"""
         if not self.state_sheet:
             logging.error("❌ Feuille state non initialisée")
             return False
             
         try:
-            # Sauvegarder avec timestamp
-            self.state_sheet.append_row([
-                datetime.now().isoformat(),
-                json.dumps(state_data, indent=2)
-            ])
+            with self._counter_lock:
+                # Écraser l'emplacement le plus ancien : une seule écriture, ni lecture ni suppression
+                row = 2 + (self._state_slot % STATE_SLOTS)
+                self._pending_state = (row, [now_iso(), encode_state_cell(state_data)])
+                self._state_slot += 1
+                self._state_records = min(self._state_records + 1, STATE_SLOTS)
             
-            # Garder seulement les 10 dernières sauvegardes
-            records = self.state_sheet.get_all_records()
-            if len(records) > 10:
-                self.state_sheet.delete_rows(2, len(records) - 9)  # Garde 10 lignes
+            if not self.flush():
+                return False
             
             logging.info("💾 État sauvegardé dans Google Sheets")
             return True
@@ -209,12 +509,11 @@ class GoogleSheetsHandler:
             return {"positions": {}, "processed_alerts": {}}
             
         try:
-            records = self.state_sheet.get_all_records()
-            if records:
-                # Prendre le DERNIER enregistrement
-                last_record = records[-1]
-                state_json = last_record["state_json"]
-                return json.loads(state_json)
+            # Lire le bloc du buffer circulaire et prendre la sauvegarde la plus RÉCENTE
+            rows = [row for row in self._read_state_slots() if len(row) >= 2 and row[1]]
+            if rows:
+                last_record = max(rows, key=lambda row: row[0])
+                return decode_state_cell(last_record[1])
             else:
                 return {"positions": {}, "processed_alerts": {}}
                 
@@ -222,11 +521,15 @@ class GoogleSheetsHandler:
             logging.error(f"❌ Erreur chargement état: {e}")
             return {"positions": {}, "processed_alerts": {}}
     
+    def _read_state_slots(self):
+        """Lit les emplacements du buffer circulaire d'état en une requête"""
+        return self.state_sheet.get(f"A2:B{STATE_SLOTS + 1}")
+    
     def get_sheets_info(self):
         """Retourne les infos des feuilles"""
         try:
-            history_records = len(self.history_sheet.get_all_records()) if self.history_sheet else 0
-            state_records = len(self.state_sheet.get_all_records()) if self.state_sheet else 0
+            history_records = max(self._history_row_count - 1, 0) if self.history_sheet else 0
+            state_records = self._state_records if self.state_sheet else 0
             
             return {
                 "history_records": history_records,
@@ -248,6 +551,8 @@ else:
     client = Client(API_KEY, API_SECRET)
     logging.info("🚀 Mode LIVE activé - ATTENTION!")
 
+configure_http_session(client.session)
+
 # Ta stratégie de niveaux
 LEVELS = [
     {"capital": 1.0,  "leverage": 50, "tp_pct": 0.003, "sl_pct": 0.003},
@@ -257,25 +562,185 @@ LEVELS = [
     {"capital": 16.0, "leverage": 65, "tp_pct": 0.003, "sl_pct": 0.003},
 ]
 
+# Colonnes des niveaux pré-extraites une fois (indexées par niveau - 1)
+_LVL_TP = tuple(level["tp_pct"] for level in LEVELS)
+_LVL_SL = tuple(level["sl_pct"] for level in LEVELS)
+_N_LEVELS = len(LEVELS)
+# Niveau de renforcement suivant après le niveau i+1 (retour au niveau 1 après le dernier)
+_NEXT_REINF = tuple(i + 2 if i + 1 < _N_LEVELS else 1 for i in range(_N_LEVELS))
+# Multiplicateurs (TP, SL) par niveau et par direction, appliqués au prix d'entrée
+_LVL_MUL = tuple(
+    {"BUY": (1 + tp, 1 - sl), "SELL": (1 - tp, 1 + sl)}
+    for tp, sl in zip(_LVL_TP, _LVL_SL)
+)
+
+def tp_sl_prices(entry_price: float, level: int, signal: str):
+    """Prix TP/SL théoriques d'une position (signal déjà en majuscules)"""
+    tp_mul, sl_mul = _LVL_MUL[level - 1]["BUY" if signal == "BUY" else "SELL"]
+    return entry_price * tp_mul, entry_price * sl_mul
+
 # ==================== GESTION D'ÉTAT AVEC VERROUS ====================
 state_lock = threading.Lock()
-symbol_locks: Dict[str, threading.Lock] = {}
+
+# Table de verrous à bandes : pas de verrou global ni de dict qui grossit
+SYMBOL_LOCK_STRIPES = 64  # Puissance de 2
+symbol_locks = [threading.Lock() for _ in range(SYMBOL_LOCK_STRIPES)]
 
 def get_symbol_lock(symbol: str):
-    with state_lock:
-        if symbol not in symbol_locks:
-            symbol_locks[symbol] = threading.Lock()
-        return symbol_locks[symbol]
+    return symbol_locks[hash(symbol) & (SYMBOL_LOCK_STRIPES - 1)]
+
+async def acquire_symbol_lock(lock: threading.Lock, timeout: float = 10) -> bool:
+    """Acquiert un verrou de symbole depuis la boucle d'événements, sans fuite si la tâche est annulée"""
+    # Libre : acquisition directe, sans passer par un thread
+    if lock.acquire(blocking=False):
+        return True
+    future = asyncio.get_running_loop().run_in_executor(None, lock.acquire, True, timeout)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        # Le thread peut encore obtenir le verrou après l'annulation : le rendre dès qu'il l'a
+        def release_if_acquired(f):
+            if not f.cancelled() and f.exception() is None and f.result():
+                lock.release()
+        future.add_done_callback(release_if_acquired)
+        raise
+
+# L'état vit en mémoire ; le fichier local et Google Sheets en sont des copies
+_state_cache = None
+_state_dirty = threading.Event()
+# fsync demandé par une modification critique (ouverture/fermeture de position)
+_state_sync_requested = False
+
+def _read_local_state():
+    """Lit l'état depuis le fichier local (None si absent ou illisible)"""
+    try:
+        with open(STATE_FILE, "rb") as f:
+            return orjson.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"⚠️ Fichier état local illisible: {e}")
+        return None
+
+# fdatasync ne force que les données (pas les métadonnées comme mtime) ; fsync sur les OS qui ne l'ont pas
+_datasync = getattr(os, "fdatasync", os.fsync)
+# state_flusher et shutdown_flush partagent le même fichier temporaire : un seul écrivain à la fois
+_state_write_lock = threading.Lock()
+
+def _write_local_state(payload: bytes, sync: bool = False):
+    """Écrit l'état dans le fichier local de façon atomique (un seul write, fdatasync si sync)"""
+    tmp_path = STATE_FILE + ".tmp"
+    with _state_write_lock:
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+            if sync:
+                f.flush()
+                _datasync(f.fileno())
+        os.replace(tmp_path, STATE_FILE)
 
 def load_state():
-    """Charge l'état depuis Google Sheets"""
-    return gsheets.load_state()
+    """Retourne l'état en mémoire (chargé au premier appel : fichier local, sinon Google Sheets)"""
+    global _state_cache
+    if _state_cache is None:
+        with state_lock:
+            if _state_cache is None:
+                state = _read_local_state()
+                if state is None:
+                    state = gsheets.load_state()
+                    logging.info("📥 État chargé depuis Google Sheets")
+                else:
+                    logging.info(f"📥 État chargé depuis {STATE_FILE}")
+                _state_cache = state
+    return _state_cache
 
-def save_state(state):
-    """Sauvegarde l'état dans Google Sheets"""
-    success = gsheets.save_state(state)
-    if not success:
-        logging.error("❌ Échec sauvegarde état Google Sheets")
+def save_state(state, sync=False):
+    """Met à jour l'état en mémoire et planifie sa persistance (sync : fsync + Google Sheets sans délai)"""
+    global _state_cache, _state_sync_requested
+    _state_cache = state
+    if sync:
+        _state_sync_requested = True
+    _state_dirty.set()
+
+def flush_state(force_sheets=False, sync=False):
+    """Écrit l'état sur disque, puis dans Google Sheets si demandé"""
+    global _state_sync_requested
+    sync = sync or _state_sync_requested
+    _state_sync_requested = False
+    # Sérialisation en un seul appel : copie figée même si un autre thread modifie l'état ensuite
+    payload = orjson.dumps(_state_cache)
+    try:
+        _write_local_state(payload, sync)
+    except Exception as e:
+        logging.error(f"❌ Échec sauvegarde état locale: {e}")
+    
+    if force_sheets:
+        # Octets déjà sérialisés : ni reparse ni nouvelle sérialisation
+        success = gsheets.save_state(payload)
+        if not success:
+            logging.error("❌ Échec sauvegarde état Google Sheets")
+        return success
+    return True
+
+def state_flusher():
+    """Persiste l'état modifié : disque après STATE_WRITE_DEBOUNCE s, Google Sheets au plus toutes les STATE_SYNC_INTERVAL s
+    (immédiatement pour une modification critique : le disque de Render est éphémère)"""
+    last_sheets_sync = 0.0
+    sheets_pending = False
+    
+    while True:
+        dirty = _state_dirty.wait(timeout=STATE_SYNC_INTERVAL)
+        if dirty:
+            # Laisser arriver les autres modifications d'une même rafale : une seule écriture
+            time.sleep(STATE_WRITE_DEBOUNCE)
+            _state_dirty.clear()
+            sheets_pending = True
+        
+        # save_state(sync=True) (ouverture/fermeture de position) contourne le délai Google Sheets
+        critical = _state_sync_requested
+        sheets_due = sheets_pending and (critical or time.monotonic() - last_sheets_sync >= STATE_SYNC_INTERVAL)
+        if dirty or sheets_due:
+            success = flush_state(force_sheets=sheets_due)
+            if sheets_due:
+                last_sheets_sync = time.monotonic()
+                sheets_pending = not success
+
+ALERT_DEDUP_TTL = 3600  # Durée de mémorisation des alertes déjà traitées (secondes)
+MAX_PROCESSED_ALERTS = int(os.getenv("MAX_PROCESSED_ALERTS", "1000"))  # Borne la taille du state_json
+
+def register_alert(state, alert_id: str, now: int):
+    """Enregistre une alerte ; False si elle a déjà été traitée"""
+    processed = state.get("processed_alerts")
+    if not isinstance(processed, OrderedDict):
+        # Ordre d'insertion = ordre chronologique, conservé par le JSON
+        processed = OrderedDict(processed or {})
+        state["processed_alerts"] = processed
+    
+    if alert_id in processed:
+        return False
+    processed[alert_id] = now
+    
+    # Purge par la gauche des alertes expirées : O(1) amorti par insertion
+    while processed and now - next(iter(processed.values())) > ALERT_DEDUP_TTL:
+        processed.popitem(last=False)
+    # Rafale d'alertes : éviction LRU au-delà de la borne, même avant expiration
+    while len(processed) > MAX_PROCESSED_ALERTS:
+        processed.popitem(last=False)
+    return True
+
+def clear_state():
+    """Vide l'état en mémoire sur place (les autres threads gardent la même référence)"""
+    state = load_state()
+    with state_lock:
+        # État déjà vide : ni écriture disque ni synchronisation Google Sheets
+        if not (state.get("positions") or state.get("processed_alerts")):
+            return
+        for key in ("positions", "processed_alerts"):
+            if isinstance(state.get(key), dict):
+                state[key].clear()
+            else:
+                state[key] = {}
+        # Modification critique : fsync et Google Sheets sans attendre (le disque de Render est éphémère)
+        save_state(state, sync=True)
 
 def add_to_history(entry_type, data):
     """Ajoute à l'historique Google Sheets"""
@@ -288,171 +753,500 @@ def calculate_pnl(position, close_type, close_price=None):
     try:
         entry_price = position.get("entry_price", 0)
         quantity = position.get("quantity", 0)
+        signal = position.get("signal").upper()
+        # +1 pour un long, -1 pour un short
+        sign = 1 if signal == "BUY" else -1
         
-        if close_type == "TP":
-            level_config = LEVELS[position.get("current_level", 1)-1]
-            if position.get("signal").upper() == "BUY":
-                close_price = entry_price * (1 + level_config["tp_pct"])
-            else:
-                close_price = entry_price * (1 - level_config["tp_pct"])
-        elif close_type == "SL":
-            level_config = LEVELS[position.get("current_level", 1)-1]
-            if position.get("signal").upper() == "BUY":
-                close_price = entry_price * (1 - level_config["sl_pct"])
-            else:
-                close_price = entry_price * (1 + level_config["sl_pct"])
+        if close_type in ("TP", "SL"):
+            # Multiplicateurs pré-calculés par niveau et direction
+            tp_price, sl_price = tp_sl_prices(entry_price, position.get("current_level", 1), signal)
+            close_price = tp_price if close_type == "TP" else sl_price
         
         # Si close_price est fourni (fermeture manuelle), l'utiliser
-        if close_price is None and close_type == "MANUAL":
+        elif close_price is None and close_type == "MANUAL":
             close_price = position.get("close_price", entry_price)
         
-        if position.get("signal").upper() == "BUY":
-            pnl = (close_price - entry_price) * quantity
-        else:
-            pnl = (entry_price - close_price) * quantity
-            
+        pnl = sign * (close_price - entry_price) * quantity
         return round(pnl, 4)
     except Exception as e:
         logging.error(f"❌ Erreur calcul PnL: {e}")
         return 0
 
 # ==================== CALCULS DE QUANTITÉ ====================
-SYMBOL_INFO_CACHE = {}
+EXCHANGE_INFO_TTL = 3600  # Les filtres Binance changent rarement
+EXCHANGE_INFO_MISS_TTL = 60  # Symbole inconnu (nouvelle cotation ?) : rechargement au plus toutes les 60 s
+_EXCHANGE_INFO_CACHE = {"ts": 0.0, "symbols": {}}
+_exchange_info_lock = threading.Lock()
 
-def fetch_symbol_info(symbol: str):
-    if symbol in SYMBOL_INFO_CACHE:
-        return SYMBOL_INFO_CACHE[symbol]
+def _count_decimals(step: float):
+    """Nombre de décimales d'un pas (tickSize / stepSize)"""
+    # Via l'exposant Decimal : gère aussi la notation scientifique (str(0.00001) == '1e-05')
+    return max(0, -Decimal(str(step)).normalize().as_tuple().exponent)
+
+def _build_symbol_entry(s):
+    """Pré-calcule les valeurs numériques utilisées pour placer les ordres"""
+    filters = {f['filterType']: f for f in s['filters']}
+    lot_size = filters.get('LOT_SIZE')
+    price_filter = filters.get('PRICE_FILTER')
+    
+    step_size = float(lot_size['stepSize']) if lot_size else 0.0001
+    tick_size = float(price_filter['tickSize']) if price_filter else None
+    
+    # Arrondi entier possible uniquement si le pas est une puissance de 10 (0.001, 1...)
+    step_decimals = _count_decimals(step_size)
+    qty_pow10 = 10 ** step_decimals
+    if abs(step_size * qty_pow10 - 1) > 1e-9:
+        qty_pow10 = None
+    
+    return {
+        "raw": s,
+        "step_size": step_size,
+        "tick_size": tick_size,
+        "qty_precision": step_decimals if lot_size else 3,
+        "qty_pow10": qty_pow10,
+        "price_precision": _count_decimals(tick_size) if price_filter else 2,
+    }
+
+def refresh_exchange_info():
+    """Télécharge l'exchange info complète une seule fois pour tous les symboles"""
     info = client.futures_exchange_info()
-    for s in info['symbols']:
-        if s['symbol'] == symbol:
-            SYMBOL_INFO_CACHE[symbol] = s
-            return s
-    raise Exception(f"Symbole {symbol} non trouvé")
-
-def get_step_size(symbol: str):
-    s = fetch_symbol_info(symbol)
-    for f in s['filters']:
-        if f['filterType'] == 'LOT_SIZE':
-            return float(f['stepSize'])
-    return 0.0001
+    symbols = {s['symbol']: _build_symbol_entry(s) for s in info['symbols']}
+    _EXCHANGE_INFO_CACHE["symbols"] = symbols
+    _EXCHANGE_INFO_CACHE["ts"] = time.monotonic()
+    logging.info(f"📚 Exchange info mise en cache: {len(symbols)} symboles")
+    return symbols
+
+def get_exchange_symbols(max_age: float = EXCHANGE_INFO_TTL):
+    """Table des symboles en cache, rechargée si elle a plus de max_age secondes"""
+    symbols = _EXCHANGE_INFO_CACHE["symbols"]
+    if not symbols or time.monotonic() - _EXCHANGE_INFO_CACHE["ts"] > max_age:
+        with _exchange_info_lock:
+            # Un seul rafraîchissement même si plusieurs threads arrivent ensemble
+            symbols = _EXCHANGE_INFO_CACHE["symbols"]
+            if not symbols or time.monotonic() - _EXCHANGE_INFO_CACHE["ts"] > max_age:
+                symbols = refresh_exchange_info()
+    return symbols
+
+def fetch_symbol_info(symbol: str):
+    entry = get_exchange_symbols().get(symbol)
+    if entry is None:
+        entry = get_exchange_symbols(EXCHANGE_INFO_MISS_TTL).get(symbol)
+    if entry is None:
+        raise Exception(f"Symbole {symbol} non trouvé")
+    return entry
 
 def get_price_precision(symbol: str):
     """Récupère la précision de prix pour un symbole"""
     try:
-        symbol_info = fetch_symbol_info(symbol)
-        for f in symbol_info['filters']:
-            if f['filterType'] == 'PRICE_FILTER':
-                tick_size = float(f['tickSize'])
-                # Calcul du nombre de décimales
-                if tick_size < 1:
-                    return len(str(tick_size).split('.')[1].rstrip('0'))
-                else:
-                    return 0
-        return 2  # Valeur par défaut
+        return fetch_symbol_info(symbol)["price_precision"]
     except Exception as e:
         logging.warning(f"⚠️ Impossible de récupérer la précision prix: {e}")
         return 2
 
-def get_quantity_precision(symbol):
-    """Récupère la précision de quantité pour un symbole"""
-    try:
-        info = client.futures_exchange_info()
-        for s in info['symbols']:
-            if s['symbol'] == symbol:
-                for f in s['filters']:
-                    if f['filterType'] == 'LOT_SIZE':
-                        step_size = float(f['stepSize'])
-                        # Calcul du nombre de décimales
-                        if step_size < 1:
-                            return len(str(step_size).split('.')[1].rstrip('0'))
-                        return 0
-        return 3  # Valeur par défaut
-    except Exception as e:
-        logging.warning(f"⚠️ Impossible de récupérer la précision: {e}")
-        return 3
-
-def round_qty(qty: float, step: float):
-    step_dec = Decimal(str(step))
-    q = Decimal(str(qty))
-    rounded = (q // step_dec) * step_dec
-    return float(rounded.quantize(step_dec, rounding=ROUND_DOWN))
+def round_qty(qty: float, symbol: str):
+    """Arrondit la quantité au pas du symbole (vers le bas)"""
+    symbol_info = fetch_symbol_info(symbol)
+    pow10 = symbol_info["qty_pow10"]
+    if pow10:
+        # Tolérance pour les flottants du type 0.29 * 100 = 28.999999999999996
+        return math.floor(qty * pow10 + 1e-9) / pow10
+    
+    # Pas exotique (ex: 5, 0.5) : nombre entier de pas, puis nettoyage des décimales parasites
+    step = symbol_info["step_size"]
+    return round(math.floor(qty / step + 1e-9) * step, symbol_info["qty_precision"])
 
 def calculate_quantity(capital, leverage, price, symbol):
     """Calcule la quantité avec la bonne précision"""
     notional = capital * leverage
     raw_quantity = notional / price
     
-    step = get_step_size(symbol)
-    quantity = round_qty(raw_quantity, step)
+    quantity = round_qty(raw_quantity, symbol)
     
     logging.info(f"📊 Calcul quantité: {capital} × {leverage} = {notional} / {price} = {raw_quantity} → {quantity}")
     return quantity
 
+# Préchargement au démarrage pour que le premier webhook ne paie pas le téléchargement
+try:
+    refresh_exchange_info()
+except Exception as e:
+    logging.warning(f"⚠️ Préchargement exchange info impossible: {e}")
+
+# ==================== FLUX WEBSOCKET (UTILISATEUR + PRIX) ====================
+# Exécutions poussées par Binance : orderId -> Event / prix moyen
+_order_events: Dict[int, threading.Event] = {}
+_order_fills: Dict[int, float] = {}
+_order_events_lock = threading.Lock()
+MAX_TRACKED_ORDERS = 1000
+
+user_stream = None
+# Vivacité du flux utilisateur : un flux démarré mais muet ne doit pas ralentir la détection des TP/SL
+USER_STREAM_MAX_SILENCE = float(os.getenv("USER_STREAM_MAX_SILENCE", 120.0))
+_user_stream_last_msg = 0.0  # time.monotonic() du dernier message valide
+_user_stream_last_error = 0.0  # time.monotonic() de la dernière erreur signalée
+
+def user_stream_healthy() -> bool:
+    """Flux utilisateur démarré, message reçu récemment et aucune erreur depuis"""
+    last_msg = _user_stream_last_msg
+    return (
+        user_stream is not None
+        and last_msg > _user_stream_last_error
+        and time.monotonic() - last_msg <= USER_STREAM_MAX_SILENCE
+    )
+
+# Derniers prix poussés par le flux !ticker@arr : symbole -> (prix, instant de réception)
+_last_prices: Dict[str, tuple] = {}
+PRICE_MAX_AGE = 5.0  # Au-delà, le prix est jugé périmé et on repasse par REST
+
+def handle_ticker_message(msg):
+    """Callback du flux multiplexé !ticker@arr (tous les symboles, ~1 mise à jour/s)"""
+    # Une exception remontée ici tuerait la tâche d'écoute du websocket
+    try:
+        if isinstance(msg, dict):
+            if msg.get("e") == "error":
+                logging.warning(f"⚠️ Erreur flux tickers: {msg.get('m')}")
+                return
+            msg = msg.get("data", [])
+        now = time.monotonic()
+        for ticker in msg:
+            _last_prices[ticker["s"]] = (float(ticker["c"]), now)
+    except Exception as e:
+        logging.warning(f"⚠️ Message ticker illisible: {e}")
+
+def get_cached_price(symbol: str):
+    """Dernier prix reçu par websocket, ou None s'il est absent ou périmé"""
+    entry = _last_prices.get(symbol)
+    if entry and time.monotonic() - entry[1] <= PRICE_MAX_AGE:
+        return entry[0]
+    return None
+
+def _get_order_event(order_id: int):
+    with _order_events_lock:
+        return _order_events.setdefault(order_id, threading.Event())
+
+def _release_order_event(order_id: int):
+    with _order_events_lock:
+        _order_events.pop(order_id, None)
+        return _order_fills.pop(order_id, None)
+
+def handle_user_stream_message(msg):
+    """Callback du flux utilisateur Futures (ORDER_TRADE_UPDATE)"""
+    global _user_stream_last_msg, _user_stream_last_error
+    # Une exception remontée ici tuerait l'écoute du flux dont dépend la détection des TP/SL
+    try:
+        event_type = msg.get("e")
+        if event_type == "error":
+            _user_stream_last_error = time.monotonic()
+            logging.warning(f"⚠️ Erreur flux utilisateur: {msg.get('m')}")
+            return
+        _user_stream_last_msg = time.monotonic()
+        if event_type != "ORDER_TRADE_UPDATE":
+            return
+    
+        order = msg.get("o", {})
+        order_id = order.get("i")
+        status = order.get("X")
+        if status in TERMINAL_ORDER_STATUSES:
+            _remember_order_status(order_id, status, order)
+            invalidate_position_cache(order.get("s"))
+            # TP/SL exécuté ou annulé (fermeture manuelle) : le monitoring traite la position tout de suite
+            # Lecture du seul cache mémoire : jamais d'appel Google Sheets sur le thread du websocket
+            state = _state_cache
+            if state is None or order.get("s") in state.get("positions", {}):
+                monitor_wake.set()
+        if status != "FILLED":
+            return
+    
+        with _order_events_lock:
+            _order_fills[order_id] = float(order.get("ap", 0))
+            event = _order_events.setdefault(order_id, threading.Event())
+            # Les ordres que personne n'attend (TP/SL...) ne doivent pas s'accumuler
+            while len(_order_events) > MAX_TRACKED_ORDERS:
+                oldest = next(iter(_order_events))
+                _order_events.pop(oldest)
+                _order_fills.pop(oldest, None)
+        event.set()
+    except Exception as e:
+        logging.warning(f"⚠️ Message flux utilisateur illisible: {e}")
+
+def start_user_stream():
+    """Ouvre le flux utilisateur Futures ; en cas d'échec on reste en polling REST"""
+    global user_stream
+    try:
+        twm = ThreadedWebsocketManager(api_key=API_KEY, api_secret=API_SECRET, testnet=USE_TESTNET)
+        twm.start()
+        twm.start_futures_user_socket(callback=handle_user_stream_message)
+        user_stream = twm
+        logging.info("📡 Flux utilisateur Futures démarré")
+    except Exception as e:
+        user_stream = None
+        logging.warning(f"⚠️ Flux utilisateur indisponible, polling REST utilisé: {e}")
+        return
+    
+    try:
+        # start_all_ticker_futures_socket s'abonne à !bookTicker (sans prix "c") : flux !ticker@arr explicite
+        user_stream.start_futures_multiplex_socket(callback=handle_ticker_message, streams=["!ticker@arr"])
+        logging.info("📡 Flux des prix Futures démarré")
+    except Exception as e:
+        logging.warning(f"⚠️ Flux des prix indisponible, prix via REST: {e}")
+
 # ==================== GESTION DES ORDRES ====================
+ORDER_PUSH_WAIT = 1.0  # Attente max de l'exécution poussée avant chaque vérification REST
+
 def wait_for_order_execution(symbol, order_id, max_attempts=10):
     """Attend que l'ordre soit exécuté et retourne le prix moyen"""
-    for i in range(max_attempts):
-        try:
-            order_status = client.futures_get_order(symbol=symbol, orderId=order_id)
-            status = order_status['status']
-            avg_price = float(order_status['avgPrice'])
-            executed_qty = float(order_status['executedQty'])
-            
-            logging.info(f"📊 Statut ordre {i+1}/{max_attempts}: {status}, Prix: {avg_price}, Qty exécutée: {executed_qty}")
+    # Exécution poussée par le websocket si disponible ; le polling REST reste actif entre deux attentes
+    event = _get_order_event(order_id) if user_stream is not None else None
+    try:
+        for i in range(max_attempts):
+            if event is not None and event.wait(timeout=ORDER_PUSH_WAIT):
+                with _order_events_lock:
+                    avg_price = _order_fills.get(order_id)
+                if avg_price:
+                    logging.info(f"🎉 Ordre exécuté (websocket)! Prix moyen: {avg_price}")
+                    return avg_price
+                # Exécution sans prix moyen : réarmer pour garder une attente entre deux appels REST
+                event.clear()
             
-            if status == 'FILLED' and avg_price > 0:
-                logging.info(f"🎉 Ordre exécuté! Prix moyen: {avg_price}")
-                return avg_price
-            elif status in ['CANCELED', 'EXPIRED', 'REJECTED']:
-                raise Exception(f"Ordre {status}")
+            try:
+                order_status = client.futures_get_order(symbol=symbol, orderId=order_id)
+                status = order_status['status']
+                avg_price = float(order_status['avgPrice'])
+                executed_qty = float(order_status['executedQty'])
                 
-        except Exception as e:
-            logging.warning(f"⚠️ Erreur vérification ordre: {e}")
-        
-        time.sleep(1)
+                logging.info(f"📊 Statut ordre {i+1}/{max_attempts}: {status}, Prix: {avg_price}, Qty exécutée: {executed_qty}")
+                
+                if status == 'FILLED' and avg_price > 0:
+                    logging.info(f"🎉 Ordre exécuté! Prix moyen: {avg_price}")
+                    return avg_price
+                elif status in ['CANCELED', 'EXPIRED', 'REJECTED']:
+                    raise Exception(f"Ordre {status}")
+                    
+            except Exception as e:
+                logging.warning(f"⚠️ Erreur vérification ordre: {e}")
+            
+            # Sans websocket, l'attente sur l'événement est remplacée par une pause fixe
+            if event is None:
+                time.sleep(1)
+    finally:
+        if event is not None:
+            _release_order_event(order_id)
     
     # Fallback: utiliser le prix actuel
-    ticker = client.futures_symbol_ticker(symbol=symbol)
-    current_price = float(ticker['price'])
+    current_price = get_cached_price(symbol)
+    if current_price is None:
+        current_price = fetch_ticker_price(symbol)
     logging.info(f"⏰ Timeout, utilisation prix actuel: {current_price}")
     return current_price
 
+# Endpoint public v2 : ni signature ni timestamp nécessaires
+# client.FUTURES_URL reste l'URL live même en testnet (python-binance ne bascule que par requête)
+FUTURES_BASE_URL = client.FUTURES_TESTNET_URL if client.testnet else client.FUTURES_URL
+TICKER_PRICE_URL = f"{FUTURES_BASE_URL}/v2/ticker/price"
+
+def _get_ticker_prices(params=None):
+    response = client.session.get(TICKER_PRICE_URL, params=params, timeout=2)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+def fetch_ticker_price(symbol: str) -> float:
+    """Prix d'un symbole via la session HTTP partagée, sans passer par python-binance"""
+    return float(_get_ticker_prices({"symbol": symbol})["price"])
+
+def get_all_prices() -> Dict[str, float]:
+    """Prix de tous les symboles en un seul appel REST"""
+    return {t["symbol"]: float(t["price"]) for t in _get_ticker_prices()}
+
+# Statuts définitifs : une fois atteints, inutile de réinterroger Binance
+TERMINAL_ORDER_STATUSES = frozenset({"FILLED", "CANCELED", "EXPIRED", "REJECTED"})
+UNKNOWN_ORDER_TTL = 60  # Durée du cache négatif "ordre inexistant" (secondes)
+_order_status_cache: Dict[int, tuple] = {}
+_unknown_orders: Dict[int, float] = {}
+
+def _remember_order_status(order_id: int, status: str, order):
+    with _order_events_lock:
+        _order_status_cache[order_id] = (status, order)
+        while len(_order_status_cache) > MAX_TRACKED_ORDERS:
+            _order_status_cache.pop(next(iter(_order_status_cache)), None)
+
 def cancel_order(symbol: str, order_id: int):
     """Annule un ordre"""
+    cached = _order_status_cache.get(order_id)
+    if cached:
+        logging.debug(f"⏭️ Ordre {order_id} déjà {cached[0]}, annulation ignorée")
+        return
+    unknown_since = _unknown_orders.get(order_id)
+    if unknown_since and time.monotonic() - unknown_since < UNKNOWN_ORDER_TTL:
+        return
+    
     try:
-        client.futures_cancel_order(symbol=symbol, orderId=order_id)
+        order = client.futures_cancel_order(symbol=symbol, orderId=order_id)
+        _remember_order_status(order_id, "CANCELED", order)
+        invalidate_position_cache(symbol)
         logging.info(f"✅ Ordre annulé: {order_id} sur {symbol}")
+    except BinanceAPIException as e:
+        if e.code == -2011:  # Unknown order sent
+            now = time.monotonic()
+            for expired_id in [oid for oid, ts in _unknown_orders.items() if now - ts >= UNKNOWN_ORDER_TTL]:
+                del _unknown_orders[expired_id]
+            _unknown_orders[order_id] = now
+        logging.warning(f"❌ Échec annulation ordre {order_id}: {e}")
     except Exception as e:
         logging.warning(f"❌ Échec annulation ordre {order_id}: {e}")
 
+def cancel_all_orders_for_symbol(symbol: str, order_ids=(), open_orders=None):
+    """Annule tous les ordres ouverts d'un symbole en un seul appel (DELETE allOpenOrders)"""
+    pending = [oid for oid in order_ids if oid and oid not in _order_status_cache]
+    # Rien à annuler : ordres connus déjà terminés, ou instantané récent sans ordre ouvert
+    # Aucun statut n'est déduit ici : seuls ceux observés (REST ou flux utilisateur) sont mis en cache
+    if (order_ids and not pending) or open_orders == []:
+        logging.debug(f"⏭️ Aucun ordre à annuler sur {symbol}")
+        return
+    
+    try:
+        client.futures_cancel_all_open_orders(symbol=symbol)
+        invalidate_position_cache(symbol)
+        logging.info(f"✅ Ordres ouverts annulés sur {symbol}")
+    except Exception as e:
+        logging.warning(f"❌ Échec annulation des ordres {symbol}: {e}")
+
 def get_order_status(symbol: str, order_id: int):
     """Récupère le statut d'un ordre"""
+    cached = _order_status_cache.get(order_id)
+    if cached:
+        return cached
+    
     try:
         order = client.futures_get_order(symbol=symbol, orderId=order_id)
-        return order.get("status"), order
+        status = order.get("status")
+        if status in TERMINAL_ORDER_STATUSES:
+            _remember_order_status(order_id, status, order)
+        return status, order
     except Exception as e:
         logging.debug(f"❌ Échec récupération statut ordre {order_id}: {e}")
         return None, None
 
-def get_position_amount(symbol: str):
-    """Vérification simplifiée de la position"""
+TP_SL_ORDER_TYPES = frozenset({'STOP_MARKET', 'TAKE_PROFIT_MARKET'})
+
+# Poids Binance de GET /fapi/v1/openOrders : 40 sans symbole, 1 par symbole
+OPEN_ORDERS_ALL_WEIGHT = 40
+
+def get_open_orders_by_symbol(symbols):
+    """Ordres ouverts des symboles demandés, groupés par symbole (au moindre poids de requête)"""
+    by_symbol = defaultdict(list)
+    if len(symbols) >= OPEN_ORDERS_ALL_WEIGHT:
+        # Beaucoup de symboles : un seul appel global revient moins cher
+        for order in client.futures_get_open_orders():
+            by_symbol[order['symbol']].append(order)
+        return by_symbol
+    
+    # Quelques symboles : un appel de poids 1 chacun, en parallèle
+    results = order_executor.map(lambda symbol: client.futures_get_open_orders(symbol=symbol), symbols)
+    for symbol, orders in zip(symbols, results):
+        by_symbol[symbol] = orders
+    return by_symbol
+
+# Cache court des positions : évite de réinterroger Binance pour le même symbole en rafale
+POSITION_CACHE_TTL = 0.5
+_position_cache: Dict[str, tuple] = {}
+
+def invalidate_position_cache(symbol: str):
+    _position_cache.pop(symbol, None)
+
+def get_position_amount(symbol: str, open_orders=None):
+    """Vérification simplifiée de la position (open_orders : instantané déjà récupéré)"""
     try:
         # Méthode alternative: vérifier via les ordres ouverts
-        open_orders = client.futures_get_open_orders(symbol=symbol)
-        has_tp_sl = any(order['type'] in ['STOP_MARKET', 'TAKE_PROFIT_MARKET'] for order in open_orders)
+        if open_orders is None:
+            cached = _position_cache.get(symbol)
+            if cached and time.monotonic() - cached[0] < POSITION_CACHE_TTL:
+                return cached[1]
+            open_orders = client.futures_get_open_orders(symbol=symbol)
+        has_tp_sl = any(order['type'] in TP_SL_ORDER_TYPES for order in open_orders)
+        amount = 1.0 if has_tp_sl else 0.0  # Valeur non nulle si position active
+        _position_cache[symbol] = (time.monotonic(), amount)
         
         if has_tp_sl:
             logging.info(f"🔍 Position {symbol} active (TP/SL trouvés)")
-            return 1.0  # Retourne une valeur non nulle
         else:
             logging.info(f"🔍 Position {symbol} - Aucun TP/SL trouvé")
-            return 0.0
+        return amount
             
     except Exception as e:
         logging.warning(f"⚠️ Erreur vérification position {symbol}: {e}")
         return 1.0  # En cas d'erreur, suppose que la position est active
 
 # ==================== PLACEMENT DES ORDRES AVEC closePosition ====================
+# Pool partagé pour les requêtes d'ordres indépendantes (TP + SL)
+order_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="orders")
+
+def _find_order_by_client_id(symbol, client_order_id):
+    """orderId d'un ordre déjà accepté par Binance sous ce clientOrderId (None s'il n'existe pas)"""
+    try:
+        return client.futures_get_order(symbol=symbol, origClientOrderId=client_order_id).get("orderId")
+    except BinanceAPIException as e:
+        if e.code == -2013:  # Ordre inexistant
+            return None
+        raise
+
+def _place_close_position_order(symbol, side, order_type, stop_price, label, client_order_id, max_retries=3):
+    """Place un ordre closePosition (TP ou SL) avec retry, retourne son orderId"""
+    for attempt in range(max_retries):
+        try:
+            # Tentative précédente sans réponse : l'ordre a peut-être été accepté, ne pas le doubler
+            if attempt > 0:
+                existing_id = _find_order_by_client_id(symbol, client_order_id)
+                if existing_id:
+                    logging.info(f"✅ {label} déjà placé: {existing_id}")
+                    return existing_id
+            order = client.futures_create_order(
+                symbol=symbol,
+                side=side,
+                type=order_type,
+                stopPrice=stop_price,
+                closePosition=True,
+                timeInForce="GTC",
+                newClientOrderId=client_order_id
+            )
+            order_id = order.get("orderId")
+            logging.info(f"✅ {label} placé: {order_id}")
+            return order_id
+        except Exception as e:
+            logging.error(f"❌ Erreur placement {label} (tentative {attempt+1}/{max_retries}): {e}")
+            if attempt < max_retries - 1:
+                time.sleep(1)
+            else:
+                logging.error(f"💥 Échec placement {label} après {max_retries} tentatives")
+    return None
+
+def _place_tp_sl_batch(symbol, tp_side, tp_price, sl_side, sl_price, price_precision, client_order_ids):
+    """Place TP et SL en un seul POST /fapi/v1/batchOrders ; None pour un ordre refusé"""
+    orders = [
+        {
+            "symbol": symbol,
+            "side": side,
+            "type": order_type,
+            "stopPrice": f"{stop_price:.{price_precision}f}",
+            "closePosition": "true",
+            "timeInForce": "GTC",
+            "newClientOrderId": client_order_id
+        }
+        for side, order_type, stop_price, client_order_id in (
+            (tp_side, "TAKE_PROFIT_MARKET", tp_price, client_order_ids[0]),
+            (sl_side, "STOP_MARKET", sl_price, client_order_ids[1])
+        )
+    ]
+    results = client.futures_place_batch_order(batchOrders=orders)
+    
+    order_ids = []
+    for label, result in zip(("TP", "SL"), results):
+        order_id = result.get("orderId")
+        if order_id:
+            logging.info(f"✅ {label} placé: {order_id}")
+        else:
+            logging.warning(f"⚠️ {label} refusé dans le lot: {result.get('msg')}")
+        order_ids.append(order_id)
+    return order_ids
+
 def place_tp_sl_orders_with_retry(symbol, signal, entry_price, level_config, max_retries=3):
     """Place les ordres Take Profit et Stop Loss avec retry en cas d'échec"""
     tp_pct = level_config["tp_pct"]
@@ -476,56 +1270,45 @@ def place_tp_sl_orders_with_retry(symbol, signal, entry_price, level_config, max
     
     logging.info(f"🎯 TP: {tp_price} (précision: {price_precision}), SL: {sl_price}")
     
-    # Ordre Take Profit avec closePosition
-    tp_order_id = None
-    sl_order_id = None
+    # clientOrderId déterministes, réutilisés par le repli : un ordre accepté sans réponse n'est jamais doublé
+    stamp = int(time.time() * 1000)
+    tp_client_id, sl_client_id = f"tp_{symbol}_{stamp}", f"sl_{symbol}_{stamp}"
     
-    # Placement TP avec retry
-    for attempt in range(max_retries):
+    # TP et SL dans une seule requête batchOrders
+    try:
+        tp_order_id, sl_order_id = _place_tp_sl_batch(
+            symbol, tp_side, tp_price, sl_side, sl_price, price_precision, (tp_client_id, sl_client_id)
+        )
+    except Exception as e:
+        # Réponse perdue (timeout, connexion coupée) : le lot a pu être accepté, vérifier avant de replacer
+        logging.warning(f"⚠️ Échec batchOrders TP/SL: {e} - Vérification des ordres existants")
+        tp_order_id = sl_order_id = None
         try:
-            tp_order = client.futures_create_order(
-                symbol=symbol,
-                side=tp_side,
-                type="TAKE_PROFIT_MARKET",
-                stopPrice=tp_price,
-                closePosition=True,
-                timeInForce="GTC"
-            )
-            tp_order_id = tp_order.get("orderId")
-            logging.info(f"✅ TP placé: {tp_order_id}")
-            break
-        except Exception as e:
-            logging.error(f"❌ Erreur placement TP (tentative {attempt+1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                time.sleep(1)
-            else:
-                logging.error(f"💥 Échec placement TP après {max_retries} tentatives")
+            tp_order_id = _find_order_by_client_id(symbol, tp_client_id)
+            sl_order_id = _find_order_by_client_id(symbol, sl_client_id)
+        except Exception as lookup_error:
+            logging.warning(f"⚠️ Vérification TP/SL impossible: {lookup_error}")
     
-    # Placement SL avec retry
-    for attempt in range(max_retries):
-        try:
-            sl_order = client.futures_create_order(
-                symbol=symbol,
-                side=sl_side,
-                type="STOP_MARKET",
-                stopPrice=sl_price,
-                closePosition=True,
-                timeInForce="GTC"
-            )
-            sl_order_id = sl_order.get("orderId")
-            logging.info(f"✅ SL placé: {sl_order_id}")
-            break
-        except Exception as e:
-            logging.error(f"❌ Erreur placement SL (tentative {attempt+1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                time.sleep(1)
-            else:
-                logging.error(f"💥 Échec placement SL après {max_retries} tentatives")
+    # Ordre absent ou refusé : placement individuel avec retry (TP et SL en parallèle, mêmes clientOrderId)
+    tp_future = sl_future = None
+    if not tp_order_id:
+        tp_future = order_executor.submit(
+            _place_close_position_order, symbol, tp_side, "TAKE_PROFIT_MARKET", tp_price, "TP", tp_client_id, max_retries
+        )
+    if not sl_order_id:
+        sl_future = order_executor.submit(
+            _place_close_position_order, symbol, sl_side, "STOP_MARKET", sl_price, "SL", sl_client_id, max_retries
+        )
+    if tp_future is not None:
+        tp_order_id = tp_future.result()
+    if sl_future is not None:
+        sl_order_id = sl_future.result()
     
     return tp_order_id, sl_order_id
 
 def place_binance_order(symbol, signal, quantity, level_config):
     """Place un ordre sur Binance avec TP/SL en utilisant closePosition=True"""
+    invalidate_position_cache(symbol)
     try:
         leverage = level_config["leverage"]
         
@@ -563,155 +1346,260 @@ def place_binance_order(symbol, signal, quantity, level_config):
         raise
 
 # ==================== MONITORING AVEC DÉLAI DE GRÂCE ====================
+# Intervalle adaptatif : POLL_INTERVAL avec positions actives, doublé à chaque tour à vide
+MONITOR_MIN_INTERVAL = 0.2
+MONITOR_MAX_INTERVAL = 10.0
+MONITOR_JITTER = 0.2
+# Avec le flux utilisateur, les exécutions réveillent le monitoring : le polling ne sert qu'à réconcilier
+MONITOR_RECONCILE_INTERVAL = float(os.getenv("MONITOR_RECONCILE_INTERVAL", 60.0))
+
+# Backoff après erreurs consécutives (borné, avec jitter pour désynchroniser les reprises)
+MONITOR_ERROR_BACKOFF_MAX = 60.0
+
+def error_backoff_delay(consecutive_errors: int, error=None):
+    """Délai après erreur : Retry-After de Binance si limité (418/429), sinon exponentiel + jitter"""
+    if isinstance(error, BinanceAPIException) and error.status_code in (418, 429):
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+    return min(MONITOR_ERROR_BACKOFF_MAX, 1.5 ** consecutive_errors) + random.uniform(0, 0.5)
+
+# Réveil immédiat du monitoring à l'arrivée d'un webhook ou d'un événement d'ordre
+monitor_wake = threading.Event()
+
+# Positions actives sans aucun changement depuis MONITOR_QUIET_ITERS tours : intervalle doublé
+MONITOR_QUIET_ITERS = 5
+
+def next_monitor_interval(idle_iters: int, fast: bool = False, quiet_iters: int = 0):
+    """Délai avant le prochain tour : backoff exponentiel borné + jitter"""
+    if user_stream_healthy() and not fast:
+        base, ceiling = MONITOR_RECONCILE_INTERVAL, MONITOR_RECONCILE_INTERVAL
+    else:
+        base, ceiling = POLL_INTERVAL, MONITOR_MAX_INTERVAL
+    if quiet_iters >= MONITOR_QUIET_ITERS and not fast:
+        base *= 2
+    delay = min(max(base * (2 ** idle_iters), MONITOR_MIN_INTERVAL), ceiling)
+    return max(0.0, delay + random.uniform(-MONITOR_JITTER, MONITOR_JITTER))
+
+# Pool dédié aux vérifications par symbole du monitoring
+MONITOR_WORKERS = int(os.getenv("MONITOR_WORKERS", 8))
+monitor_executor = ThreadPoolExecutor(max_workers=MONITOR_WORKERS, thread_name_prefix="monitor")
+
+def closed_position_history(symbol, position, close_type, profit_loss, next_level=1, close_price=None):
+    """Données d'historique communes à toutes les fermetures de position"""
+    data = {
+        "symbol": symbol,
+        "direction": position.get("signal"),
+        "level": position.get("current_level", 1),
+        "entry_price": position.get("entry_price"),
+        "quantity": position.get("quantity"),
+        "close_type": close_type,
+        "profit_loss": profit_loss,
+        "next_reinforcement_level": next_level,
+        "open_ts": position.get("open_ts")
+    }
+    if close_price is not None:
+        data["close_price"] = close_price
+    return data
+
+def handle_tp_sl_fill(symbol: str, position: Dict[str, Any], state: Dict[str, Any], close_type: str, sibling_id):
+    """Traite l'exécution d'un TP ou d'un SL : annulation de l'ordre opposé, historique, état"""
+    current_level = position.get("current_level", 1)
+    if close_type == "TP":
+        logging.info(f"🎯 TP exécuté pour {symbol} (niveau {current_level})")
+        history_data = closed_position_history(symbol, position, "TAKE_PROFIT", calculate_pnl(position, "TP"))
+    else:
+        logging.info(f"🛑 SL exécuté pour {symbol} (niveau {current_level})")
+        history_data = closed_position_history(symbol, position, "STOP_LOSS", calculate_pnl(position, "SL"), _NEXT_REINF[current_level - 1])
+    
+    # Annuler l'ordre opposé
+    if sibling_id:
+        cancel_order(symbol, sibling_id)
+    
+    # Ajouter à l'historique
+    add_to_history("POSITION_CLOSED", history_data)
+    
+    if close_type == "TP":
+        # Fermer la position dans l'état
+        position["is_active"] = False
+        save_state(state, sync=True)
+    else:
+        # Gérer le renforcement
+        handle_reinforcement(symbol, position.get("signal"), current_level, state, position)
+
+def check_symbol_position(symbol: str, position: Dict[str, Any], state: Dict[str, Any], open_orders_by_symbol, price_of) -> bool:
+    """Vérifie les ordres TP/SL d'une position; renvoie True si elle est encore dans son délai de grâce"""
+    if not position.get("is_active", True):
+        return False
+    
+    # DÉLAI DE GRÂCE : Ne pas vérifier les positions de moins de 30 secondes
+    # open_ts (epoch) ; les états plus anciens n'ont qu'un timestamp ISO, converti une seule fois
+    open_ts = position.get("open_ts")
+    if open_ts is None:
+        position_timestamp = position.get("timestamp", "")
+        if position_timestamp:
+            try:
+                position_time = datetime.fromisoformat(position_timestamp.replace('Z', '+00:00'))
+                open_ts = position_time.timestamp()
+                position["open_ts"] = open_ts
+            except Exception as e:
+                logging.warning(f"⚠️ Erreur calcul délai position: {e}")
+                return False
+    
+    time_diff = time.time() - open_ts if open_ts is not None else float("inf")
+    if time_diff < 30:
+        logging.debug(f"⏳ Position {symbol} trop récente ({time_diff:.1f}s) - Attente avant vérification")
+        return True
+    
+    # Verrou pour éviter les conflits
+    lock = get_symbol_lock(symbol)
+    if not lock.acquire(blocking=False):
+        return False
+    
+    try:
+        tp_order_id = position.get("tp_order_id")
+        sl_order_id = position.get("sl_order_id")
+        
+        symbol_orders = None
+        open_order_ids = set()
+        if open_orders_by_symbol is not None:
+            symbol_orders = open_orders_by_symbol.get(symbol, [])
+            open_order_ids = {order['orderId'] for order in symbol_orders}
+        
+        # Vérifier d'abord les ordres TP/SL (méthode principale)
+        # Un ordre encore ouvert n'est pas exécuté : inutile d'interroger son statut
+        for close_type, order_id, sibling_id in (("TP", tp_order_id, sl_order_id), ("SL", sl_order_id, tp_order_id)):
+            if not order_id or order_id in open_order_ids:
+                continue
+            status, _ = get_order_status(symbol, order_id)
+            if status in ("FILLED", "TRIGGERED"):
+                handle_tp_sl_fill(symbol, position, state, close_type, sibling_id)
+                return False
+        
+        # SEULEMENT SI AUCUN ORDRE TP/SL N'A ÉTÉ DÉCLENCHÉ : vérifier position
+        position_amount = get_position_amount(symbol, symbol_orders)
+        if position_amount == 0 and position.get("is_active", True):
+            # Vérifier que la position a au moins 60 secondes avant nettoyage
+            if time_diff > 60:
+                logging.info(f"📝 Position {symbol} fermée manuellement après {time_diff:.1f}s - Nettoyage")
+                
+                # Récupérer le prix actuel pour le PnL
+                current_price = price_of(symbol)
+                
+                # Ajouter à l'historique
+                history_data = closed_position_history(symbol, position, "MANUAL", calculate_pnl(position, "MANUAL", current_price), close_price=current_price)
+                add_to_history("POSITION_CLOSED", history_data)
+                
+                position["is_active"] = False
+                cancel_all_orders_for_symbol(symbol, (tp_order_id, sl_order_id), symbol_orders)
+                save_state(state, sync=True)
+            else:
+                logging.debug(f"⏳ Position {symbol} trop récente pour nettoyage ({time_diff:.1f}s)")
+
+    finally:
+        lock.release()
+    return False
+
 def monitor_loop():
     """Boucle de surveillance des positions et ordres TP/SL"""
     logging.info("🔍 Démarrage du monitoring automatique")
+    idle_iters = 0
+    in_grace_period = False
+    consecutive_errors = 0
+    quiet_iters = 0
+    last_snapshot = None
     
     while True:
+        last_error = None
         try:
             state = load_state()
-            positions = state.get("positions", {})
+            # Copie unique par tour : le dict est modifié en parallèle par les webhooks (boucle d'événements)
+            items = list(state.get("positions", {}).items())
             
-            for symbol, position in list(positions.items()):
-                if not position.get("is_active", True):
-                    continue
-                
-                # DÉLAI DE GRÂCE : Ne pas vérifier les positions de moins de 30 secondes
-                position_timestamp = position.get("timestamp", "")
-                if position_timestamp:
-                    try:
-                        position_time = datetime.fromisoformat(position_timestamp.replace('Z', '+00:00'))
-                        time_diff = (datetime.now().replace(tzinfo=None) - position_time.replace(tzinfo=None)).total_seconds()
-                        
-                        if time_diff < 30:
-                            logging.debug(f"⏳ Position {symbol} trop récente ({time_diff:.1f}s) - Attente avant vérification")
-                            continue
-                    except Exception as e:
-                        logging.warning(f"⚠️ Erreur calcul délai position: {e}")
-                        continue
-                
-                # Verrou pour éviter les conflits
-                lock = get_symbol_lock(symbol)
-                if not lock.acquire(blocking=False):
-                    continue
-                
+            if any(position.get("is_active", True) for _, position in items):
+                idle_iters = 0
+            else:
+                idle_iters = min(idle_iters + 1, 10)
+            
+            # Position dans son délai de grâce : rester au rythme rapide pour la vérifier dès que possible
+            in_grace_period = False
+            
+            # Ordres ouverts des positions actives, récupérés une fois par tour
+            open_orders_by_symbol = None
+            if idle_iters == 0:
                 try:
-                    current_level = position.get("current_level", 1)
-                    tp_order_id = position.get("tp_order_id")
-                    sl_order_id = position.get("sl_order_id")
-                    signal = position.get("signal")
-                    entry_price = position.get("entry_price")
-                    
-                    # Vérifier d'abord les ordres TP/SL (méthode principale)
-                    order_triggered = False
-                    
-                    if tp_order_id:
-                        status, _ = get_order_status(symbol, tp_order_id)
-                        if status in ("FILLED", "TRIGGERED"):
-                            logging.info(f"🎯 TP exécuté pour {symbol} (niveau {current_level})")
-                            # Annuler SL
-                            if sl_order_id:
-                                cancel_order(symbol, sl_order_id)
-                            
-                            # Ajouter à l'historique
-                            history_data = {
-                                "symbol": symbol,
-                                "direction": signal,
-                                "level": current_level,
-                                "entry_price": entry_price,
-                                "quantity": position.get("quantity"),
-                                "close_type": "TAKE_PROFIT",
-                                "profit_loss": calculate_pnl(position, "TP"),
-                                "next_reinforcement_level": 1,
-                                "open_timestamp": position.get("timestamp")
-                            }
-                            add_to_history("POSITION_CLOSED", history_data)
-                            
-                            # Fermer la position dans l'état
-                            position["is_active"] = False
-                            save_state(state)
-                            order_triggered = True
-                            continue
-                    
-                    if sl_order_id and not order_triggered:
-                        status, _ = get_order_status(symbol, sl_order_id)
-                        if status in ("FILLED", "TRIGGERED"):
-                            logging.info(f"🛑 SL exécuté pour {symbol} (niveau {current_level})")
-                            # Annuler TP
-                            if tp_order_id:
-                                cancel_order(symbol, tp_order_id)
-                            
-                            # Ajouter à l'historique
-                            history_data = {
-                                "symbol": symbol,
-                                "direction": signal,
-                                "level": current_level,
-                                "entry_price": entry_price,
-                                "quantity": position.get("quantity"),
-                                "close_type": "STOP_LOSS",
-                                "profit_loss": calculate_pnl(position, "SL"),
-                                "next_reinforcement_level": current_level + 1 if current_level < len(LEVELS) else 1,
-                                "open_timestamp": position.get("timestamp")
-                            }
-                            add_to_history("POSITION_CLOSED", history_data)
-                            
-                            # Gérer le renforcement
-                            handle_reinforcement(symbol, signal, current_level, state, position)
-                            order_triggered = True
-                            continue
-                    
-                    # SEULEMENT SI AUCUN ORDRE TP/SL N'A ÉTÉ DÉCLENCHÉ : vérifier position
-                    if not order_triggered:
-                        position_amount = get_position_amount(symbol)
-                        if position_amount == 0 and position.get("is_active", True):
-                            # Vérifier que la position a au moins 60 secondes avant nettoyage
-                            if time_diff > 60:
-                                logging.info(f"📝 Position {symbol} fermée manuellement après {time_diff:.1f}s - Nettoyage")
-                                
-                                # Récupérer le prix actuel pour le PnL
-                                ticker = client.futures_symbol_ticker(symbol=symbol)
-                                current_price = float(ticker['price'])
-                                
-                                # Ajouter à l'historique
-                                history_data = {
-                                    "symbol": symbol,
-                                    "direction": signal,
-                                    "level": current_level,
-                                    "entry_price": entry_price,
-                                    "quantity": position.get("quantity"),
-                                    "close_price": current_price,
-                                    "close_type": "MANUAL",
-                                    "profit_loss": calculate_pnl(position, "MANUAL", current_price),
-                                    "next_reinforcement_level": 1,
-                                    "open_timestamp": position.get("timestamp")
-                                }
-                                add_to_history("POSITION_CLOSED", history_data)
-                                
-                                position["is_active"] = False
-                                if tp_order_id:
-                                    cancel_order(symbol, tp_order_id)
-                                if sl_order_id:
-                                    cancel_order(symbol, sl_order_id)
-                                save_state(state)
-                            else:
-                                logging.debug(f"⏳ Position {symbol} trop récente pour nettoyage ({time_diff:.1f}s)")
-                        
-                finally:
-                    lock.release()
+                    open_orders_by_symbol = get_open_orders_by_symbol(
+                        [symbol for symbol, position in items if position.get("is_active", True)]
+                    )
+                except Exception as e:
+                    last_error = e
+                    logging.warning(f"⚠️ Erreur récupération ordres ouverts: {e}")
+            
+            # Prix de tous les symboles, récupérés au plus une fois par tour (fermetures manuelles)
+            prices: Dict[str, float] = {}
+            prices_lock = threading.Lock()
+            
+            def price_of(symbol: str) -> float:
+                cached_price = get_cached_price(symbol)
+                if cached_price is not None:
+                    return cached_price
+                with prices_lock:
+                    if not prices:
+                        prices.update(get_all_prices())
+                    return prices[symbol]
+            
+            # Chaque symbole est vérifié indépendamment : la latence ne croît plus avec le nombre de positions
+            futures = {
+                monitor_executor.submit(check_symbol_position, symbol, position, state, open_orders_by_symbol, price_of): symbol
+                for symbol, position in items
+            }
+            for future, symbol in futures.items():
+                try:
+                    if future.result():
+                        in_grace_period = True
+                except Exception as e:
+                    # Limite de requêtes atteinte : ralentir tout le monitoring, pas seulement ce symbole
+                    if isinstance(e, BinanceAPIException) and e.status_code in (418, 429):
+                        last_error = e
+                    logging.error(f"❌ Erreur monitoring {symbol}: {e}")
+            
+            # Aucune transition (ouverture, fermeture, renforcement) depuis le tour précédent ?
+            snapshot = tuple(
+                (symbol, position.get("is_active", True), position.get("current_level"), position.get("order_id"))
+                for symbol, position in items
+            )
+            quiet_iters = quiet_iters + 1 if snapshot == last_snapshot else 0
+            last_snapshot = snapshot
                     
         except Exception as e:
+            last_error = e
             logging.error(f"❌ Erreur dans monitor_loop: {e}")
         
-        time.sleep(5)  # Vérifier toutes les 5 secondes
+        if last_error is not None:
+            consecutive_errors += 1
+            delay = error_backoff_delay(consecutive_errors, last_error)
+            logging.warning(f"⏳ Monitoring en pause {delay:.1f}s ({consecutive_errors} erreur(s) consécutive(s))")
+            time.sleep(delay)
+            continue
+        consecutive_errors = 0
+        
+        if monitor_wake.wait(timeout=next_monitor_interval(idle_iters, in_grace_period, quiet_iters)):
+            monitor_wake.clear()
+            idle_iters = 0
+            quiet_iters = 0
 
 def handle_reinforcement(symbol, signal, current_level, state, position):
     """Prépare le renforcement pour le prochain signal (quelle que soit la direction)"""
     next_level = current_level + 1
     
-    if next_level > len(LEVELS):
+    if next_level > _N_LEVELS:
         logging.info(f"💥 Niveau maximum atteint pour {symbol} - Séquence terminée")
         position["is_active"] = False
-        save_state(state)
+        save_state(state, sync=True)
         return
     
     # Préparer le renforcement sans direction spécifique
@@ -724,25 +1612,34 @@ def handle_reinforcement(symbol, signal, current_level, state, position):
         "next_level": next_level
     })
     
-    save_state(state)
+    save_state(state, sync=True)
 
-# Démarrer le monitoring
+# Démarrer le flux utilisateur puis le monitoring
+start_user_stream()
 monitor_thread = threading.Thread(target=monitor_loop, daemon=True)
 monitor_thread.start()
 
+# Démarrer la persistance de l'état
+state_flusher_thread = threading.Thread(target=state_flusher, daemon=True)
+state_flusher_thread.start()
+
 # ==================== FONCTION DE TRAITEMENT DES SIGNALS ====================
 async def process_trading_signal(signal, symbol, price, data, webhook_source="principal"):
     """Traite les signaux de trading (commun aux deux webhooks)"""
     if not signal or price == 0:
         raise HTTPException(status_code=400, detail="Signal ou prix manquant")
+    signal = signal.upper()
+    
+    # Un webhook peut ouvrir une position : remettre le monitoring au rythme rapide
+    monitor_wake.set()
     
-    # Verrou pour ce symbole
+    # Verrou partagé avec le monitoring (attente hors de la boucle d'événements)
     lock = get_symbol_lock(symbol)
-    if not lock.acquire(timeout=10):
+    if not await acquire_symbol_lock(lock, 10):
         raise HTTPException(status_code=429, detail="Symbole occupé")
     
     try:
-        state = load_state()
+        state = await asyncio.to_thread(load_state)
         positions = state.get("positions", {})
         
         # VÉRIFIER SI RENFORCEMENT EN ATTENTE (quelle que soit la direction)
@@ -758,17 +1655,18 @@ async def process_trading_signal(signal, symbol, price, data, webhook_source="pr
                 level_config = LEVELS[next_level - 1]
                 capital = level_config["capital"]
                 leverage = level_config["leverage"]
-                quantity = calculate_quantity(capital, leverage, price, symbol)
+                quantity = await asyncio.to_thread(calculate_quantity, capital, leverage, price, symbol)
                 
                 if quantity <= 0:
                     raise HTTPException(status_code=400, detail="Quantité invalide")
                 
                 # Placer l'ordre de renforcement avec la NOUVELLE direction
-                order_result, entry_price, tp_order_id, sl_order_id = place_binance_order(
-                    symbol, signal, quantity, level_config
+                order_result, entry_price, tp_order_id, sl_order_id = await asyncio.to_thread(
+                    place_binance_order, symbol, signal, quantity, level_config
                 )
                 
                 # Ajouter à l'historique
+                tp_price, sl_price = tp_sl_prices(entry_price, next_level, signal)
                 history_data = {
                     "symbol": symbol,
                     "direction": signal,
@@ -777,13 +1675,13 @@ async def process_trading_signal(signal, symbol, price, data, webhook_source="pr
                     "quantity": quantity,
                     "capital": capital,
                     "leverage": leverage,
-                    "tp_price": entry_price * (1 + level_config["tp_pct"]) if signal.upper() == "BUY" else entry_price * (1 - level_config["tp_pct"]),
-                    "sl_price": entry_price * (1 - level_config["sl_pct"]) if signal.upper() == "BUY" else entry_price * (1 + level_config["sl_pct"]),
+                    "tp_price": tp_price,
+                    "sl_price": sl_price,
                     "order_id": order_result['orderId'],
                     "tp_order_id": tp_order_id,
                     "sl_order_id": sl_order_id,
                     "previous_level": next_level - 1,
-                    "next_reinforcement_level": next_level + 1 if next_level < len(LEVELS) else 1
+                    "next_reinforcement_level": _NEXT_REINF[next_level - 1]
                 }
                 add_to_history("REINFORCEMENT_OPENED", history_data)
                 
@@ -800,9 +1698,9 @@ async def process_trading_signal(signal, symbol, price, data, webhook_source="pr
                     "order_id": order_result['orderId'],
                     "tp_order_id": tp_order_id,
                     "sl_order_id": sl_order_id,
-                    "timestamp": datetime.now().isoformat()
+                    "open_ts": time.time()
                 })
-                save_state(state)
+                save_state(state, sync=True)
                 
                 return {
                     "status": "success", 
@@ -821,16 +1719,14 @@ async def process_trading_signal(signal, symbol, price, data, webhook_source="pr
         
         # VÉRIFICATION DES DOUBLONS
         alert_id = f"{symbol}_{signal}_{data.get('time', '')}"
-        processed = state.setdefault("processed_alerts", {})
-        if alert_id in processed:
+        if not register_alert(state, alert_id, int(time.time())):
             return {"status": "ignored", "reason": "duplicate_alert", "webhook": webhook_source}
-        processed[alert_id] = int(time.time())
         
         # VÉRIFIER SI POSITION ACTIVE
         if symbol in state.get("positions", {}):
             position = state["positions"][symbol]
             if position.get("is_active", True):
-                position_amount = get_position_amount(symbol)
+                position_amount = await asyncio.to_thread(get_position_amount, symbol)
                 if position_amount != 0:
                     return {"status": "ignored", "reason": "position_already_open", "webhook": webhook_source}
                 else:
@@ -841,17 +1737,18 @@ async def process_trading_signal(signal, symbol, price, data, webhook_source="pr
         level_config = LEVELS[0]
         capital = level_config["capital"]
         leverage = level_config["leverage"]
-        quantity = calculate_quantity(capital, leverage, price, symbol)
+        quantity = await asyncio.to_thread(calculate_quantity, capital, leverage, price, symbol)
         
         if quantity <= 0:
             raise HTTPException(status_code=400, detail="Quantité invalide")
         
-        # Placer l'ordre
-        order_result, entry_price, tp_order_id, sl_order_id = place_binance_order(
-            symbol, signal, quantity, level_config
+        # Placer l'ordre (appels Binance bloquants exécutés dans un thread)
+        order_result, entry_price, tp_order_id, sl_order_id = await asyncio.to_thread(
+            place_binance_order, symbol, signal, quantity, level_config
         )
         
         # Ajouter à l'historique
+        tp_price, sl_price = tp_sl_prices(entry_price, 1, signal)
         history_data = {
             "symbol": symbol,
             "direction": signal,
@@ -860,8 +1757,8 @@ async def process_trading_signal(signal, symbol, price, data, webhook_source="pr
             "quantity": quantity,
             "capital": capital,
             "leverage": leverage,
-            "tp_price": entry_price * (1 + level_config["tp_pct"]) if signal.upper() == "BUY" else entry_price * (1 - level_config["tp_pct"]),
-            "sl_price": entry_price * (1 - level_config["sl_pct"]) if signal.upper() == "BUY" else entry_price * (1 + level_config["sl_pct"]),
+            "tp_price": tp_price,
+            "sl_price": sl_price,
             "order_id": order_result['orderId'],
             "tp_order_id": tp_order_id,
             "sl_order_id": sl_order_id,
@@ -882,11 +1779,11 @@ async def process_trading_signal(signal, symbol, price, data, webhook_source="pr
             "tp_order_id": tp_order_id,
             "sl_order_id": sl_order_id,
             "alert_id": alert_id,
-            "timestamp": datetime.now().isoformat(),
+            "open_ts": time.time(),
             "pending_reinforcement": False,
             "next_level": 1  # 🔥 Initialiser le niveau suivant
         }
-        save_state(state)
+        save_state(state, sync=True)
         
         return {
             "status": "success", 
@@ -906,25 +1803,163 @@ async def process_trading_signal(signal, symbol, price, data, webhook_source="pr
     finally:
         lock.release()
 
+# ==================== FILE D'ATTENTE DES SIGNAUX ====================
+# Les webhooks accusent réception immédiatement ; les ordres sont passés en arrière-plan
+SIGNAL_QUEUE_SIZE = int(os.getenv("SIGNAL_QUEUE_SIZE", 1000))
+SIGNAL_CONSUMERS = int(os.getenv("SIGNAL_CONSUMERS", 4))  # Symboles différents traités en parallèle
+SIGNAL_DRAIN_TIMEOUT = 20  # Attente max des signaux en file à l'arrêt (secondes)
+# Une file par consommateur, choisie par symbole : les signaux d'un même symbole sont traités dans l'ordre
+signal_queues: list = []
+_signal_consumer_tasks: list = []
+
+def ensure_signal_consumers():
+    """Crée les files et leurs consommateurs au premier besoin (appelé dans la boucle d'événements)"""
+    if signal_queues:
+        return
+    consumers = max(1, SIGNAL_CONSUMERS)
+    queue_size = max(1, SIGNAL_QUEUE_SIZE // consumers)
+    for i in range(consumers):
+        signal_queue = asyncio.Queue(maxsize=queue_size)
+        signal_queues.append(signal_queue)
+        _signal_consumer_tasks.append(
+            asyncio.create_task(signal_consumer(signal_queue), name=f"signal-consumer-{i}")
+        )
+    logging.info(f"📬 File de signaux active ({consumers} consommateurs)")
+
+def signal_queue_for(symbol: str) -> asyncio.Queue:
+    # Création paresseuse : un webhook reçu sans lifespan (TestClient, montage) ne trouve pas de liste vide
+    ensure_signal_consumers()
+    return signal_queues[hash(symbol) % len(signal_queues)]
+
+async def signal_consumer(signal_queue: asyncio.Queue):
+    """Consomme une file de signaux ; un signal en échec n'interrompt pas la boucle"""
+    while True:
+        item = await signal_queue.get()
+        try:
+            result = await process_trading_signal(**item)
+            logging.info(f"✅ Signal {item['symbol']} traité ({item['webhook_source']}): {result.get('status')}")
+        except HTTPException as e:
+            logging.warning(f"⚠️ Signal {item['symbol']} rejeté: {e.detail}")
+        except Exception as e:
+            logging.error(f"❌ Erreur traitement signal {item['symbol']}: {e}")
+        finally:
+            signal_queue.task_done()
+
+def enqueue_signal(signal, symbol, price, data, webhook_source):
+    """Met un signal en file et renvoie un accusé de réception 202"""
+    if not signal or price == 0:
+        raise HTTPException(status_code=400, detail="Signal ou prix manquant")
+    signal_queue = signal_queue_for(symbol)
+    try:
+        signal_queue.put_nowait({
+            "signal": signal,
+            "symbol": symbol,
+            "price": price,
+            "data": data,
+            "webhook_source": webhook_source
+        })
+    except asyncio.QueueFull:
+        logging.error(f"❌ File de signaux pleine - Signal {symbol} refusé")
+        raise HTTPException(status_code=503, detail="File de signaux pleine")
+    return ORJSONResponse(status_code=202, content={
+        "status": "queued",
+        "webhook": webhook_source,
+        "symbol": symbol,
+        "signal": signal,
+        "queue_size": signal_queue.qsize()
+    })
+
+async def drain_signal_queue():
+    """Laisse les signaux déjà acceptés être traités avant la sauvegarde finale"""
+    if all(signal_queue.empty() for signal_queue in signal_queues):
+        return
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(*(signal_queue.join() for signal_queue in signal_queues)),
+            timeout=SIGNAL_DRAIN_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        pending = sum(signal_queue.qsize() for signal_queue in signal_queues)
+        logging.warning(f"⚠️ {pending} signaux non traités à l'arrêt")
+
+async def stop_signal_consumers():
+    """Annule les consommateurs et attend leur fin"""
+    for task in _signal_consumer_tasks:
+        task.cancel()
+    await asyncio.gather(*_signal_consumer_tasks, return_exceptions=True)
+    _signal_consumer_tasks.clear()
+    signal_queues.clear()
+
 # ==================== ENDPOINTS FASTAPI ====================
+# Préfixe ISO de la seconde courante, recalculé une seule fois par seconde
+_iso_second = (0, "")
+
+def now_iso():
+    """Horodatage ISO local, équivalent à datetime.now().isoformat() pour les réponses"""
+    global _iso_second
+    ts = time.time()
+    second = int(ts)
+    cached = _iso_second
+    if cached[0] != second:
+        cached = _iso_second = (second, time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(second)))
+    return f"{cached[1]}.{int((ts - second) * 1_000_000):06d}"
+
+def _make_etag(body: bytes):
+    return '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+def cached_json_response(request: Request, body: bytes, max_age: int, etag: str = None, scope: str = "public"):
+    """Réponse JSON avec ETag + Cache-Control ; 304 vide si le client a déjà ce contenu"""
+    etag = etag or _make_etag(body)
+    headers = {"ETag": etag, "Cache-Control": f"{scope}, max-age={max_age}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def configure_blocking_pool():
+    """Dimensionne les threads des appels bloquants (asyncio.to_thread et routes def)"""
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="blocking")
+    )
+    anyio_to_thread.current_default_thread_limiter().total_tokens = BLOCKING_IO_WORKERS
+
+def shutdown_flush():
+    """Vide les tampons avant l'arrêt"""
+    if _state_cache is not None:
+        flush_state(force_sheets=True, sync=True)
+    if gsheets.history_sheet:
+        gsheets.flush()
+
 @app.get("/health")
 def health():
-    return {"status":"ok", "timestamp": datetime.now().isoformat()}
+    return {"status":"ok", "timestamp": now_iso()}
+
+async def read_webhook_payload(request: Request) -> Dict[str, Any]:
+    """Décode le corps du webhook avec orjson (au lieu du json standard de request.json())"""
+    data = orjson.loads(await request.body())
+    if not isinstance(data, dict):
+        raise ValueError("Payload JSON attendu sous forme d'objet")
+    return data
+
+def enqueue_payload(data: Dict[str, Any], webhook_source: str, signal: str = None):
+    """Extrait signal, symbole et prix d'un payload décodé puis le met en file"""
+    if signal is None:
+        signal = data.get("signal", "").upper()
+    symbol = data.get("symbol", "ETHUSDC")
+    price = float(data.get("price", 0))
+    return enqueue_signal(signal, symbol, price, data, webhook_source)
 
 @app.post("/webhook")
 async def webhook(request: Request):
     """Webhook principal pour VOTRE INDICATEUR TRADING EXISTANT"""
     try:
-        data = await request.json()
+        data = await read_webhook_payload(request)
         logging.info(f"📥 Webhook PRINCIPAL reçu: {data}")
         
-        signal = data.get("signal", "").upper()
-        symbol = data.get("symbol", "ETHUSDC")
-        price = float(data.get("price", 0))
-        
-        # TRAITEMENT NORMAL DES SIGNALS TRADING
-        return await process_trading_signal(signal, symbol, price, data, "principal")
+        # TRAITEMENT NORMAL DES SIGNALS TRADING (en file, accusé de réception immédiat)
+        return enqueue_payload(data, "principal")
             
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"❌ Erreur webhook principal: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -933,7 +1968,7 @@ async def webhook(request: Request):
 async def webhook2(request: Request):
     """Webhook secondaire pour ANTI-SLEEP + DEUXIÈME INDICATEUR"""
     try:
-        data = await request.json()
+        data = await read_webhook_payload(request)
         
         signal = data.get("signal", "").upper()
         
@@ -942,7 +1977,7 @@ async def webhook2(request: Request):
             logging.info("🔁 Keep-alive ping reçu sur webhook2")
             return {
                 "status": "ping", 
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now_iso(),
                 "message": "Bot actif via webhook2",
                 "webhook": "anti-sleep"
             }
@@ -951,11 +1986,10 @@ async def webhook2(request: Request):
         logging.info(f"📥 Webhook SECONDAIRE reçu: {data}")
         
         # TRAITEMENT NORMAL POUR LE DEUXIÈME INDICATEUR
-        symbol = data.get("symbol", "ETHUSDC")
-        price = float(data.get("price", 0))
-        
-        return await process_trading_signal(signal, symbol, price, data, "secondaire")
+        return enqueue_payload(data, "secondaire", signal)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"❌ Erreur webhook2: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -965,7 +1999,10 @@ async def root_post(request: Request):
     """Accepte les POST sur la racine"""
     try:
         logging.info("🔄 Requête reçue sur la racine")
-        return await webhook(request)
+        # Même traitement que /webhook, sans repasser par son handler
+        data = await read_webhook_payload(request)
+        logging.info(f"📥 Webhook PRINCIPAL reçu: {data}")
+        return enqueue_payload(data, "principal")
     except Exception as e:
         logging.error(f"❌ Erreur route racine: {str(e)}")
         return {"status": "error", "message": str(e)}
@@ -977,18 +2014,15 @@ async def root():
 @app.get("/state")
 async def get_state():
     """Endpoint pour voir l'état actuel"""
-    return load_state()
+    return await asyncio.to_thread(load_state)
 
 @app.get("/history")
 async def get_history(limit: int = 50):
     """Endpoint pour voir l'historique des trades depuis Google Sheets"""
     try:
-        if not gsheets.history_sheet:
-            return {"history": []}
-            
-        records = gsheets.history_sheet.get_all_records()
-        # Retourner les derniers enregistrements
-        return {"history": records[-limit:] if records else []}
+        # Servi depuis la projection en mémoire, relecture de la feuille seulement si nécessaire
+        records = await asyncio.to_thread(gsheets.get_recent_records, limit)
+        return {"history": records}
     except Exception as e:
         logging.error(f"❌ Erreur chargement historique: {e}")
         return {"history": []}
@@ -997,54 +2031,7 @@ async def get_history(limit: int = 50):
 async def get_history_stats():
     """Statistiques de l'historique depuis Google Sheets"""
     try:
-        if not gsheets.history_sheet:
-            return {
-                "total_trades": 0,
-                "total_profit": 0,
-                "winning_trades": 0,
-                "losing_trades": 0,
-                "win_rate": 0
-            }
-            
-        records = gsheets.history_sheet.get_all_records()
-        if not records:
-            return {
-                "total_trades": 0,
-                "total_profit": 0,
-                "winning_trades": 0,
-                "losing_trades": 0,
-                "win_rate": 0
-            }
-        
-        # Filtrer les positions fermées
-        closed_positions = [r for r in records if r.get("Statut") == "CLOSED"]
-        
-        if not closed_positions:
-            return {
-                "total_trades": 0,
-                "total_profit": 0,
-                "winning_trades": 0,
-                "losing_trades": 0,
-                "win_rate": 0
-            }
-        
-        total_profit = sum(float(r.get("Profit/Loss (USDT)", 0)) for r in closed_positions)
-        winning_trades = len([r for r in closed_positions if float(r.get("Profit/Loss (USDT)", 0)) > 0])
-        losing_trades = len([r for r in closed_positions if float(r.get("Profit/Loss (USDT)", 0)) < 0])
-        
-        stats = {
-            "total_trades": len(closed_positions),
-            "total_profit": round(total_profit, 2),
-            "winning_trades": winning_trades,
-            "losing_trades": losing_trades,
-        }
-        
-        if stats["total_trades"] > 0:
-            stats["win_rate"] = round((stats["winning_trades"] / stats["total_trades"]) * 100, 2)
-        else:
-            stats["win_rate"] = 0
-            
-        return stats
+        return await asyncio.to_thread(gsheets.get_history_stats)
         
     except Exception as e:
         logging.error(f"❌ Erreur statistiques: {e}")
@@ -1059,8 +2046,7 @@ async def get_history_stats():
 @app.delete("/reset")
 async def reset_state():
     """Endpoint pour réinitialiser l'état"""
-    state = {"positions": {}, "processed_alerts": {}}
-    save_state(state)
+    await asyncio.to_thread(clear_state)
     return {"status": "reset", "message": "État réinitialisé"}
 
 @app.get("/gsheets/status")
@@ -1071,15 +2057,15 @@ async def gsheets_status():
 @app.post("/gsheets/backup")
 async def manual_backup():
     """Sauvegarde manuelle de l'état"""
-    state = load_state()
-    success = gsheets.save_state(state)
+    state = await asyncio.to_thread(load_state)
+    success = await asyncio.to_thread(gsheets.save_state, state)
     return {"status": "success" if success else "error", "message": "Backup manuel"}
 
 @app.get("/balance")
 async def get_balance():
     """Vérifie le solde du compte"""
     try:
-        account_info = client.futures_account()
+        account_info = await asyncio.to_thread(client.futures_account)
         assets = account_info.get('assets', [])
         positions = account_info.get('positions', [])
         
@@ -1099,47 +2085,73 @@ async def get_balance():
     except Exception as e:
         return {"error": f"General error: {str(e)}"}
 
-@app.get("/debug/binance")
-async def debug_binance():
-    """Endpoint de debug pour Binance"""
+# Indicateurs de configuration constants pour toute la durée du processus
+_ENV_FLAGS = {
+    "api_key_set": bool(API_KEY),
+    "api_secret_set": bool(API_SECRET),
+    "testnet_mode": USE_TESTNET,
+}
+
+# Sondes de diagnostic Binance : appel bloquant + résumé renvoyé au client
+_DEBUG_PROBES = {
+    "ping": (client.ping, lambda result: result),
+    "server_time": (client.get_server_time, lambda result: result),
+    "exchange_info": (get_exchange_symbols, lambda result: {"symbols_count": len(result)}),
+    "account": (client.futures_account, lambda result: {"assets_count": len(result.get('assets', []))}),
+}
+
+async def run_debug_probe(name: str):
+    """Exécute une sonde hors de la boucle d'événements ; l'erreur fait partie du résultat"""
+    call, summarize = _DEBUG_PROBES[name]
+    start = time.perf_counter()
     try:
-        ping = client.ping()
-        server_time = client.get_server_time()
-        exchange_info = client.futures_exchange_info()
-        
-        try:
-            account_info = client.futures_account()
-            account_status = "OK"
-            account_assets = len(account_info.get('assets', []))
-        except Exception as acc_e:
-            account_status = f"Error: {str(acc_e)}"
-            account_assets = 0
-        
-        return {
-            "ping": ping,
-            "server_time": server_time,
-            "symbols_count": len(exchange_info['symbols']),
-            "api_key_set": bool(API_KEY and API_KEY != ""),
-            "api_secret_set": bool(API_SECRET and API_SECRET != ""),
-            "testnet_mode": USE_TESTNET,
-            "account_status": account_status,
-            "account_assets_count": account_assets,
-            "status": "Connexion Binance OK"
-        }
+        result = {"ok": True, "result": summarize(await asyncio.to_thread(call))}
     except Exception as e:
-        return {
-            "error": str(e),
-            "api_key_set": bool(API_KEY and API_KEY != ""),
-            "api_secret_set": bool(API_SECRET and API_SECRET != ""),
-            "testnet_mode": USE_TESTNET,
-            "status": "Erreur connexion Binance"
-        }
+        result = {"ok": False, "error": str(e)}
+    return {"test": name, "rtt_ms": round((time.perf_counter() - start) * 1000, 1), **result}
+
+@app.get("/debug/binance")
+async def debug_binance(request: Request):
+    """Endpoint de debug pour Binance"""
+    # Sondes indépendantes lancées en parallèle : latence ≈ la plus lente, pas la somme
+    probes = await asyncio.gather(*(run_debug_probe(name) for name in _DEBUG_PROBES))
+    results = {probe["test"]: probe for probe in probes}
+    
+    for name in ("ping", "server_time", "exchange_info"):
+        if not results[name]["ok"]:
+            return {
+                "error": results[name]["error"],
+                **_ENV_FLAGS,
+                "status": "Erreur connexion Binance"
+            }
+    
+    account = results["account"]
+    # Données de compte : cache navigateur uniquement, quelques secondes
+    return cached_json_response(request, orjson.dumps({
+        "ping": results["ping"]["result"],
+        "server_time": results["server_time"]["result"],
+        "symbols_count": results["exchange_info"]["result"]["symbols_count"],
+        **_ENV_FLAGS,
+        "account_status": "OK" if account["ok"] else f"Error: {account['error']}",
+        "account_assets_count": account["result"]["assets_count"] if account["ok"] else 0,
+        "status": "Connexion Binance OK"
+    }), 5, scope="private")
+
+@app.get("/debug/binance/stream")
+async def debug_binance_stream():
+    """Sondes Binance diffusées en Server-Sent Events dès qu'elles répondent, avec leur durée"""
+    async def events():
+        for probe in asyncio.as_completed([run_debug_probe(name) for name in _DEBUG_PROBES]):
+            yield b"event: test\ndata: " + orjson.dumps(await probe) + b"\n\n"
+        yield b"event: done\ndata: " + orjson.dumps(_ENV_FLAGS) + b"\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
 
 @app.get("/orders")
 async def get_orders(symbol: str = "ETHUSDC"):
     """Vérifie les ordres ouverts"""
     try:
-        orders = client.futures_get_open_orders(symbol=symbol)
+        orders = await asyncio.to_thread(client.futures_get_open_orders, symbol=symbol)
         return {"symbol": symbol, "open_orders": orders}
     except Exception as e:
         return {"error": str(e)}
@@ -1148,10 +2160,12 @@ async def get_orders(symbol: str = "ETHUSDC"):
 async def check_position(symbol: str = "ETHUSDC"):
     """Vérification manuelle par prix (backup)"""
     try:
-        ticker = client.futures_symbol_ticker(symbol=symbol)
-        current_price = float(ticker['price'])
+        # Prix du flux websocket si récent, sinon un appel REST
+        current_price = get_cached_price(symbol)
+        if current_price is None:
+            current_price = await asyncio.to_thread(fetch_ticker_price, symbol)
         
-        state = load_state()
+        state = await asyncio.to_thread(load_state)
         if symbol not in state.get("positions", {}):
             return {"status": "NO_POSITION"}
         
@@ -1165,41 +2179,45 @@ async def check_position(symbol: str = "ETHUSDC"):
             "position_active": True,
             "level": position.get("current_level", 1),
             "entry_price": position.get("entry_price"),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         }
     except Exception as e:
         return {"status": "ERROR", "message": str(e)}
 
 @app.get("/precision/{symbol}")
-async def check_precision(symbol: str):
+async def check_precision(symbol: str, request: Request):
     """Vérifie la précision pour un symbole"""
     try:
-        price_precision = get_price_precision(symbol)
-        quantity_precision = get_quantity_precision(symbol)
-        step_size = get_step_size(symbol)
+        # Lecture du cache exchangeInfo (rechargé hors de la boucle d'événements si expiré)
+        info = await asyncio.to_thread(fetch_symbol_info, symbol)
         
-        return {
+        return cached_json_response(request, orjson.dumps({
             "symbol": symbol,
-            "price_precision": price_precision,
-            "quantity_precision": quantity_precision,
-            "step_size": step_size
-        }
+            "price_precision": info["price_precision"],
+            "quantity_precision": info["qty_precision"],
+            "step_size": info["step_size"]
+        }), 30)
     except Exception as e:
         return {"error": str(e)}
 
+# Les niveaux sont constants : réponse sérialisée une seule fois au démarrage
+_LEVELS_RESPONSE = orjson.dumps({
+    "strategy": "Renforcement progressif avec monitoring automatique",
+    "levels": LEVELS,
+    "total_levels": _N_LEVELS,
+    "total_capital": sum(level["capital"] for level in LEVELS)
+})
+_LEVELS_ETAG = _make_etag(_LEVELS_RESPONSE)
+
 @app.get("/levels")
-async def get_levels():
+async def get_levels(request: Request):
     """Affiche les niveaux de la stratégie"""
-    return {
-        "strategy": "Renforcement progressif avec monitoring automatique",
-        "levels": LEVELS,
-        "total_levels": len(LEVELS),
-        "total_capital": sum(level["capital"] for level in LEVELS)
-    }
+    return cached_json_response(request, _LEVELS_RESPONSE, 30, _LEVELS_ETAG)
 
 if __name__ == "__main__":
     import uvicorn
     logging.info("🚀 Démarrage du bot avec double webhook et Google Sheets")
     logging.info("🔗 Webhook 1: Trading principal")
     logging.info("🔗 Webhook 2: Anti-sleep + deuxième indicateur")
-    uvicorn.run(app, host="0.0.0.0", port=PORT)
\ No newline at end of file
+    # uvloop + parseur httptools explicites ; repli sur la boucle standard sans uvloop (Windows)
+    uvicorn.run(app, host="0.0.0.0", port=PORT, loop="uvloop" if uvloop is not None else "asyncio", http="httptools")
\ No newline at end of file